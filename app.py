@@ -1,6 +1,8 @@
 import os
 import json
+import time
 import datetime
+import threading
 import requests
 import pytz
 from dotenv import load_dotenv
@@ -38,6 +40,14 @@ ai_client = genai.Client(api_key=GEMINI_API_KEY, vertexai=True)
 # Cache for symbol mappings
 mapping_cache = {}
 
+# Quote micro-cache: proxy quote responses per (stock_code, exchange_code) for QUOTE_CACHE_TTL_S.
+# Concurrent misses for one key wait for a single in-flight proxy call instead of each making one.
+QUOTE_CACHE_TTL_S = float(os.environ.get("QUOTE_CACHE_TTL_S", "1.0"))
+quote_cache = {}          # key -> (monotonic fetched_at, body, status_code)
+quote_inflight = {}       # key -> threading.Event, set once the leader stores (body, status_code) on it
+quote_cache_lock = threading.Lock()
+quote_cache_stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
 # --- HELPERS ---
 def get_ist_now():
     return datetime.datetime.now(pytz.timezone('Asia/Kolkata'))
@@ -106,7 +116,36 @@ def set_session():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 def get_quote_data(symbol, proxy_key=""):
+    """Quote for `symbol` via the micro-cache; only one proxy call per key is ever in flight."""
     breeze_code = get_breeze_symbol(symbol)
+    key = (breeze_code, "NSE")
+    with quote_cache_lock:
+        entry = quote_cache.get(key)
+        if entry and time.monotonic() - entry[0] <= QUOTE_CACHE_TTL_S:
+            quote_cache_stats["hits"] += 1
+            return entry[1], entry[2]
+        pending = quote_inflight.get(key)
+        if pending is None:
+            quote_cache_stats["misses"] += 1
+            pending = quote_inflight[key] = threading.Event()
+            leader = True
+        else:
+            quote_cache_stats["coalesced"] += 1
+            leader = False
+    if not leader:
+        pending.wait()
+        return pending.result
+
+    body, status_code = fetch_quote_data(breeze_code, proxy_key)
+    with quote_cache_lock:
+        if status_code == 200:
+            quote_cache[key] = (time.monotonic(), body, status_code)
+        del quote_inflight[key]
+    pending.result = (body, status_code)
+    pending.set()
+    return body, status_code
+
+def fetch_quote_data(breeze_code, proxy_key=""):
     payload = {
         "stock_code": breeze_code,
         "exchange_code": "NSE",
@@ -119,6 +158,7 @@ def get_quote_data(symbol, proxy_key=""):
     try:
         res = requests.post(
             f"{BREEZE_PROXY_URL}/api/breeze/quotes",
+            json=payload,
             headers=headers
         )
         print("--- PROXY DEBUG (get_quote_data) ---")
@@ -143,6 +183,11 @@ def get_quote():
     quote, status_code = get_quote_data(symbol, proxy_key)
     return jsonify(quote), status_code
 
+@app.route('/api/market/quote/cache-stats', methods=['GET'])
+def get_quote_cache_stats():
+    with quote_cache_lock:
+        return jsonify({**quote_cache_stats, "cached_keys": len(quote_cache), "in_flight": len(quote_inflight)})
+
 @app.route('/api/market/depth', methods=['POST', 'OPTIONS'])
 def get_depth():
     if request.method == 'OPTIONS':
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Socket.IO tick dispatcher: idle CPU and enqueue-to-emit latency.
+
+Compares the event-driven dispatcher (_run_tick_dispatcher blocking on _TickChannel)
+against the legacy loop that drained a SimpleQueue and slept 5 ms between polls.
+No Breeze session is needed: _dispatch_tick is replaced by a recorder.
+
+Run: python bench_tick_dispatcher.py [--idle 5] [--ticks 2000] [--os-thread] [--conflation-ms 0]
+  --os-thread  produce ticks from a real OS thread (local `python breeze_proxy_app.py`
+               mode) instead of a green thread (gunicorn+eventlet mode).
+  --conflation-ms  TICK_CONFLATION_MS for the event-driven dispatcher (default 0, so the
+               latency numbers compare the wake-up path only).
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import queue
+import random
+import statistics
+import time
+
+import breeze_proxy_app as proxy
+
+_real_threading = eventlet.patcher.original("threading")
+_real_time = eventlet.patcher.original("time")
+
+
+def legacy_dispatcher(q, on_tick):
+    """The pre-channel dispatcher: drain, then sleep 5 ms, forever."""
+    while True:
+        while True:
+            try:
+                on_tick(q.get_nowait())
+            except queue.Empty:
+                break
+        eventlet.sleep(0.005)
+
+
+def channel_dispatcher(channel, on_tick):
+    """Runs the real _run_tick_dispatcher against a private channel and recorder."""
+    proxy._tick_dispatch_queue = channel
+    proxy._dispatch_tick = on_tick
+    proxy._run_tick_dispatcher()
+
+
+def measure_idle_cpu(seconds):
+    """CPU seconds consumed by this process per wall second while no ticks arrive."""
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    eventlet.sleep(seconds)
+    return (time.process_time() - cpu0) / (time.perf_counter() - wall0)
+
+
+def measure_latency(put, n_ticks, os_thread):
+    latencies = []
+
+    def produce():
+        sleeper = _real_time.sleep if os_thread else eventlet.sleep
+        for i in range(n_ticks):
+            put({"stock_code": "NIFTY", "last": 22000.0 + i, "_t0": time.perf_counter()})
+            sleeper(random.uniform(0.0, 0.004))
+
+    def on_tick(tick, *_):
+        latencies.append(time.perf_counter() - tick["_t0"])
+
+    if os_thread:
+        t = _real_threading.Thread(target=produce, daemon=True)
+        t.start()
+    else:
+        eventlet.spawn(produce)
+    return on_tick, latencies
+
+
+def run_case(name, spawn_dispatcher, put, args):
+    holder = {}
+
+    def on_tick(tick, *rest):
+        holder["on_tick"](tick, *rest)
+
+    gt = spawn_dispatcher(on_tick)
+    eventlet.sleep(0.05)
+    idle = measure_idle_cpu(args.idle)
+
+    holder["on_tick"], latencies = measure_latency(put, args.ticks, args.os_thread)
+    # Wait for every tick, or (with conflation) until emits stop arriving.
+    deadline, seen = time.perf_counter() + 30, -1
+    while len(latencies) < args.ticks and time.perf_counter() < deadline:
+        eventlet.sleep(0.5)
+        if len(latencies) == seen:
+            break
+        seen = len(latencies)
+    gt.kill()
+
+    lat_ms = sorted(x * 1000.0 for x in latencies)
+    p = lambda q: lat_ms[min(len(lat_ms) - 1, int(q * len(lat_ms)))] if lat_ms else float("nan")
+    print(f"{name:<14} idle_cpu={idle * 100:6.2f}%  ticks={len(lat_ms):>6}  "
+          f"p50={p(0.50):7.3f} ms  p99={p(0.99):7.3f} ms  max={(lat_ms[-1] if lat_ms else float('nan')):7.3f} ms  "
+          f"mean={(statistics.fmean(lat_ms) if lat_ms else float('nan')):7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--idle", type=float, default=5.0, help="idle measurement window (s)")
+    parser.add_argument("--ticks", type=int, default=2000, help="ticks for the latency run")
+    parser.add_argument("--os-thread", action="store_true", help="produce ticks from a real OS thread")
+    parser.add_argument("--conflation-ms", type=int, default=0, help="TICK_CONFLATION_MS for the new dispatcher")
+    args = parser.parse_args()
+    proxy.TICK_CONFLATION_MS = args.conflation_ms
+
+    print(f"producer: {'OS thread' if args.os_thread else 'green thread'}")
+    baseline = measure_idle_cpu(args.idle)
+    print(f"{'no dispatcher':<14} idle_cpu={baseline * 100:6.2f}%")
+
+    legacy_q = queue.SimpleQueue()
+    run_case("legacy 5ms", lambda cb: eventlet.spawn(legacy_dispatcher, legacy_q, cb), legacy_q.put, args)
+
+    channel = proxy._TickChannel()
+    run_case("event-driven", lambda cb: eventlet.spawn(channel_dispatcher, channel, cb), channel.put, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Replay a tick capture through the real dispatcher: throughput, dispatch latency and memory.
+
+A capture comes from running the proxy with TICK_RECORD_PATH set (see _TickRecorder), or
+from --synthesize.  ReplayBreezeClient stands in for BreezeConnect: subscribe/unsubscribe
+are no-ops, get_quotes answers from the capture, and start() feeds the recorded ticks to
+on_ticks (_global_on_ticks) at the chosen speed.  N Socket.IO test clients subscribe to
+the recorded symbols through subscribe_to_watchlist, so track_watchlist, the dispatcher
+and the room emits all run for real — only the network is missing.
+
+Run: python bench_tick_replay.py CAPTURE [--speed 1|10|max] [--clients 20] [--conflation-ms 100]
+     python bench_tick_replay.py CAPTURE --synthesize 20000 --symbols 50 [--rate 500]
+  --os-thread  feed from a real OS thread (local `python breeze_proxy_app.py` mode) instead
+               of a green thread (gunicorn+eventlet mode).
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import random
+import resource
+import time
+
+import breeze_proxy_app as proxy
+
+_real_threading = eventlet.patcher.original("threading")
+_real_time = eventlet.patcher.original("time")
+
+
+class ReplayBreezeClient:
+    """Fake BreezeConnect that plays a capture into on_ticks."""
+
+    session_key = "replay"
+
+    def __init__(self, records, speed, os_thread=False):
+        self.records = records
+        self.speed = speed              # float multiplier, or None for as fast as possible
+        self.os_thread = os_thread
+        self.on_ticks = None
+        self.finished = False
+        self.first_quote = {}
+        for _, tick in records:
+            code = proxy._resolve_tick_symbol(tick)
+            self.first_quote.setdefault(code, tick)
+
+    def ws_connect(self):
+        pass
+
+    def ws_disconnect(self):
+        pass
+
+    def subscribe_feeds(self, **kwargs):
+        pass
+
+    def unsubscribe_feeds(self, **kwargs):
+        pass
+
+    def get_quotes(self, stock_code="", **kwargs):
+        tick = dict(self.first_quote.get(stock_code) or {"stock_code": stock_code, "last": 0})
+        tick.setdefault("ltp", tick.get("last"))
+        return {"Success": [tick], "Status": 200}
+
+    def start(self):
+        if self.os_thread:
+            _real_threading.Thread(target=self._feed, daemon=True).start()
+        else:
+            eventlet.spawn(self._feed)
+
+    def _feed(self):
+        sleep = _real_time.sleep if self.os_thread else eventlet.sleep
+        first_at = self.records[0][0]
+        started = time.perf_counter()
+        for at, tick in self.records:
+            if self.speed:
+                delay = (at - first_at) / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    sleep(delay)
+            elif not self.os_thread:
+                eventlet.sleep(0)   # a real reader yields on every websocket frame
+            self.on_ticks(dict(tick))
+        self.finished = True
+
+
+def synthesize(path, n_ticks, n_symbols, rate):
+    """Write a random-walk capture: n_ticks spread over n_symbols at `rate` ticks/s."""
+    recorder = proxy._TickRecorder(path)
+    prices = {f"SYM{i:03d}": random.uniform(100, 3000) for i in range(n_symbols)}
+    volumes = dict.fromkeys(prices, 0)
+    at = time.time()
+    for _ in range(n_ticks):
+        symbol = random.choice(list(prices))
+        prices[symbol] = max(1.0, prices[symbol] * (1 + random.gauss(0, 0.0005)))
+        volumes[symbol] += random.randint(1, 500)
+        recorder.write({"stock_code": symbol, "last": round(prices[symbol], 2), "ttq": volumes[symbol],
+                        "exchange": "NSE Equity", "quotes": "Quotes"}, at)
+        at += random.expovariate(rate)
+    recorder.close()
+    print(f"wrote {n_ticks} ticks for {n_symbols} symbols to {path}")
+
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="tick capture file (TICK_RECORD_PATH output)")
+    parser.add_argument("--speed", default="max", help="replay speed multiplier (1, 10, ...) or 'max'")
+    parser.add_argument("--clients", type=int, default=20, help="simulated Socket.IO clients")
+    parser.add_argument("--conflation-ms", type=int, default=proxy.TICK_CONFLATION_MS,
+                        help="TICK_CONFLATION_MS for the dispatcher")
+    parser.add_argument("--os-thread", action="store_true", help="feed ticks from a real OS thread")
+    parser.add_argument("--synthesize", type=int, metavar="N", help="first write a synthetic capture of N ticks")
+    parser.add_argument("--symbols", type=int, default=50, help="symbols in a synthetic capture")
+    parser.add_argument("--rate", type=float, default=500.0, help="ticks/s in a synthetic capture")
+    args = parser.parse_args()
+
+    if args.synthesize:
+        synthesize(args.capture, args.synthesize, args.symbols, args.rate)
+    records = list(proxy.iter_tick_recording(args.capture))
+    if not records:
+        raise SystemExit(f"{args.capture} holds no ticks")
+    speed = None if args.speed == "max" else float(args.speed)
+    span = records[-1][0] - records[0][0]
+    print(f"capture: {len(records)} ticks over {span:.1f}s, speed={args.speed}, clients={args.clients}, "
+          f"conflation={args.conflation_ms} ms, feed={'OS thread' if args.os_thread else 'green thread'}")
+
+    client = ReplayBreezeClient(records, speed, args.os_thread)
+    proxy.TICK_CONFLATION_MS = args.conflation_ms
+    proxy.FEED_STALL_SECONDS = 1e9
+    proxy.breeze_client = client
+    proxy.ensure_breeze_session = lambda: (client, None, None)
+    proxy.get_breeze_symbol = lambda symbol: symbol
+    client.on_ticks = proxy._global_on_ticks
+
+    latencies = []
+    dispatch = proxy._dispatch_tick
+
+    def timed_dispatch(ticks, resolved=None):
+        received_at = ticks.get("_received_at")
+        dispatch(ticks, resolved)
+        if received_at is not None:
+            latencies.append(time.monotonic() - received_at)
+
+    proxy._dispatch_tick = timed_dispatch
+
+    rss_before = rss_mb()
+    symbols = sorted(client.first_quote)
+    sockets = [proxy.socketio.test_client(proxy.app) for _ in range(args.clients)]
+    for sock in sockets:
+        sock.emit("subscribe_to_watchlist", {"stocks": symbols})
+    while len(proxy._sid_feeds) < len(sockets) or any(len(v) < len(symbols) for v in proxy._sid_feeds.values()):
+        eventlet.sleep(0.05)
+    eventlet.sleep(0.5)
+    for sock in sockets:
+        sock.get_received()
+
+    delivered = 0
+    started = time.perf_counter()
+    client.start()
+    received_before = proxy._tick_stream_stats["ticks_received"]
+    while True:
+        eventlet.sleep(0.25)
+        delivered += sum(len(sock.get_received()) for sock in sockets)
+        drained = proxy._tick_stream_stats["ticks_received"] - received_before >= len(records)
+        if client.finished and drained and not proxy._tick_dispatch_queue.qsize():
+            eventlet.sleep(max(0.3, 2 * args.conflation_ms / 1000.0))
+            delivered += sum(len(sock.get_received()) for sock in sockets)
+            break
+    elapsed = time.perf_counter() - started
+
+    lat_ms = sorted(x * 1000.0 for x in latencies)
+    p = lambda q: lat_ms[min(len(lat_ms) - 1, int(q * len(lat_ms)))] if lat_ms else float("nan")
+    print(f"replayed {len(records)} ticks in {elapsed:.2f}s -> {len(records) / elapsed:,.0f} ticks/s in, "
+          f"{len(lat_ms) / elapsed:,.0f} dispatches/s, {delivered / elapsed:,.0f} client events/s")
+    print(f"dispatch latency (receive -> emitted): p50={p(0.50):.3f} ms  p99={p(0.99):.3f} ms  "
+          f"max={(lat_ms[-1] if lat_ms else float('nan')):.3f} ms  (conflated away: "
+          f"{proxy._tick_stream_stats['ticks_dropped']})")
+    print(f"queue high-water={proxy._tick_dispatch_queue.high_water}  overflow drops={proxy._tick_dispatch_queue.dropped}  "
+          f"peak RSS={rss_mb():.1f} MB (+{rss_mb() - rss_before:.1f} MB during the run)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,11 @@
+import sys
+if __name__ == "__main__" and sys.argv[1:2] == ["feed"]:
+    # The feed process (run_feed_process) has no gunicorn eventlet worker to patch the stdlib
+    # for it; unpatched, every requests / Supabase / Breeze REST call would block the hub that
+    # the tick dispatcher and the bus writers run on.  Must happen before any other import.
+    import eventlet
+    eventlet.monkey_patch()
+
 import secrets
 import queue as _stdlib_queue
 from flask import Flask, request, jsonify
@@ -12,6 +20,27 @@ import datetime
 import pytz
 import yaml
 import re
+import time
+import math
+import bisect
+import itertools
+import mmap
+import struct
+import atexit
+import contextlib
+from collections import deque
+import threading
+import socket
+import fcntl
+import zlib
+from array import array
+import eventlet
+from eventlet.event import Event as _Event
+from eventlet.corolocal import local as _greenlet_local
+from eventlet.hubs import trampoline
+from eventlet.queue import Full as _QueueFull, LightQueue as _LightQueue
+from eventlet.timeout import Timeout as _EventletTimeout
+import numpy as np
 from google import genai
 from google.genai import types
 from supabase import create_client, Client
@@ -37,6 +66,9 @@ CORS(app, resources={r"/*": {"origins": "*", "methods": ["GET", "POST", "OPTIONS
 # - ping_timeout/ping_interval: keep connections alive through Cloud Run's 60s idle timeout.
 # - allow_upgrades=True: allow HTTP long-poll sessions to upgrade to WebSocket after handshake.
 #   Clients on Cloud Run must start with polling first; this allows the subsequent upgrade.
+#   Exception: with WEB_WORKERS > 1 consecutive polls can land on different workers, which do not
+#   share Engine.IO sessions, so those deployments must use websocket-only clients
+#   (frontend built with VITE_PROXY_WEBSOCKET_ONLY=true).
 socketio = SocketIO(
     app,
     cors_allowed_origins="*",
@@ -92,16 +124,306 @@ BREEZE_SYMBOL_OVERRIDES: dict[str, str] = {
 # --- Real-time tick dispatch registry ---
 # Maps canonical frontend symbol -> set of Socket.IO SIDs subscribed to that symbol.
 # Allows multiple browser clients / components to share a single Breeze WebSocket feed.
+# Each symbol also has a Socket.IO room (see _tick_room) that mirrors this set, so a tick
+# is JSON-encoded once and broadcast to the room instead of once per subscriber.
 _tick_registry: dict[str, set] = {}   # symbol -> set(sid)
 _registry_symbol_map: dict[str, str] = {}   # canonical raw_symbol from Breeze -> frontend symbol
 _subscribed_breeze_codes: set[str] = set()  # breeze stock_codes with active subscriptions
+# Reverse index of _tick_registry plus each SID's subscribe options, so watchlist_add /
+# watchlist_remove can diff against a SID's current set without scanning every symbol.
+_sid_symbols: dict[str, set] = {}     # sid -> symbols it is registered for
+_sid_options: dict[str, tuple] = {}   # sid -> (protocol, batch, depth, rates) from subscribe_to_watchlist
+
+# --- Client-requested update rate limits (subscribe_to_watchlist max_rate / symbol_rates) ---
+# A full-protocol SID that asks for at most N updates/s on a symbol joins the throttled room
+# tick:<symbol>@<interval_ms> instead of tick:<symbol>.  The dispatcher emits to each
+# throttled room at most once per interval, tracked per (symbol, interval_ms) so one
+# encoded payload still serves every SID on that tier.  The newest skipped update is held
+# in _throttle_pending and sent when the interval elapses, so a quiet symbol never
+# leaves a throttled client on a stale price.  Batch-mode full-protocol SIDs sit in the same
+# tiers (without joining the room) and get the gated update via _batch_pending; delta-protocol
+# subscriptions ignore rate limits, since a skipped delta would be a sequence gap.
+_throttle_registry: dict[str, dict] = {}        # symbol -> {interval_ms: set(sid)}
+_throttle_last_emit: dict[tuple, float] = {}    # (symbol, interval_ms) -> monotonic time of the last emit
+_throttle_pending: dict[tuple, dict] = {}       # (symbol, interval_ms) -> newest payload not yet sent
+
+# --- Reference-counted Breeze feed subscriptions ---
+# One Breeze subscribe_feeds per code, shared by every SID that watches it.  A code is
+# subscribed on its 0→1 transition (_acquire_feed) and unsubscribed on 1→0 directly from
+# handle_disconnect (_release_sid_feeds), so client churn never re-subscribes live feeds
+# and no per-SID greenlet has to stay alive to clean up.
+_feed_refcounts: dict[str, int] = {}   # breeze_code -> number of SIDs holding it
+_sid_feeds: dict[str, set] = {}        # sid -> breeze_codes it holds
+_feed_symbols: dict[str, str] = {}     # breeze_code -> frontend symbol
+_breeze_ws_connected: bool = False
+
+# --- Breeze feed supervisor (_run_feed_supervisor) ---
+# Breeze's WebSocket can drop mid-session without any callback.  While feeds are active
+# during market hours, FEED_STALL_SECONDS without a tick is treated as a dead connection:
+# reconnect with exponential backoff (capped at FEED_RECONNECT_MAX_BACKOFF_S), resubscribe
+# exactly the codes in _feed_refcounts, then fill the gap with one pooled REST snapshot.
+FEED_STALL_SECONDS = max(5.0, float(os.environ.get("FEED_STALL_SECONDS", "30")))
+FEED_RECONNECT_MAX_BACKOFF_S = max(1.0, float(os.environ.get("FEED_RECONNECT_MAX_BACKOFF_S", "60")))
+_last_tick_at: float = 0.0          # monotonic time of the last tick from Breeze
+_feed_connected_at: float = 0.0     # monotonic time of the last successful ws_connect
+# --- Multi-worker tick bus (TICK_BUS_PATH) ---
+# With several gunicorn workers, set TICK_BUS_PATH to a UNIX socket path shared by them.
+# The worker holding an flock on <path>.lock is the feed owner: it alone holds the Breeze
+# WebSocket, serves the bus socket and publishes each normalized tick (and resolved depth
+# tick) to every other worker.  The others connect as peers: their clients' feed
+# references are forwarded to the owner (which counts each peer as one holder, like a
+# SID), and published ticks go through their own dispatcher to their own clients — the
+# fan-out a Socket.IO message_queue would do, without an external broker.  Session
+# activation on any worker is relayed to all.  If the owner exits, the lock frees and a
+# peer takes over, resubscribing everything that is still referenced.
+# Socket.IO long-polling is not sticky across gunicorn workers, so multi-worker clients
+# must connect with the websocket transport only.
+TICK_BUS_PATH = os.environ.get("TICK_BUS_PATH", "")
+TICK_BUS_PEER_BACKLOG = int(os.environ.get("TICK_BUS_PEER_BACKLOG", "10000"))
+_tick_bus = None   # _UnixTickBus when TICK_BUS_PATH is set
+
+# --- Dedicated feed process + shared-memory quote board ---
+# FEED_PROCESS=1 takes the Breeze websocket out of the web workers entirely: they only follow
+# the tick bus, and `python breeze_proxy_app.py feed` (run_feed_process) is its sole owner, so
+# ws_connect / subscribe_feeds and tick normalization never share an eventlet hub with REST
+# handlers, Supabase queries or Gemini calls, and can sit on a core of their own.
+# The owner also writes every symbol's latest normalized quote into QUOTE_BOARD_PATH (a
+# _QuoteBoard: fixed-size slots in a shared mmap, each guarded by a sequence counter); web
+# workers map the same file read-only and answer quote lookups from it with no IPC round trip.
+FEED_PROCESS = os.environ.get("FEED_PROCESS", "") == "1"
+QUOTE_BOARD_PATH = os.environ.get("QUOTE_BOARD_PATH", "")
+QUOTE_BOARD_SLOTS = int(os.environ.get("QUOTE_BOARD_SLOTS", "4096"))
+_quote_board = None   # _QuoteBoard: writable in the bus owner, read-only in web workers
+
+_feed_supervisor_stats: dict[str, int] = {
+    "stalls_detected": 0, "reconnects": 0, "reconnect_failures": 0, "gap_fill_quotes": 0,
+}
+
+
+class _TickChannel:
+    """
+    Thread-safe, bounded tick queue with an eventlet-aware wake-up.
+
+    Breeze's WebSocket reader may run on a real OS thread (local `python breeze_proxy_app.py`)
+    or a green thread (gunicorn+eventlet), so a plain eventlet.queue is not safe here and a
+    blocking SimpleQueue.get() would stall the whole hub.  Instead, put() appends to a
+    SimpleQueue and writes one byte to a self-pipe; the dispatcher greenlet parks on the
+    pipe's read end via eventlet's hub (trampoline), so it uses zero CPU while idle and
+    wakes the moment a tick is enqueued.
+
+    Backpressure: once `maxsize` ticks are queued (dispatcher starved by a blocking call),
+    put() switches to an overflow dict keyed by stock_code that keeps only the newest tick
+    per symbol, so memory stays bounded and clients don't replay a stale backlog.  While
+    the overflow holds anything, new ticks keep going there so a symbol's older overflow
+    tick can never be delivered after a newer queued one.  Both structures are only
+    touched with single GIL-atomic operations (put / get_nowait / setitem / popitem), so
+    no lock is shared between the OS thread and the hub.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize            # 0 = unbounded
+        self._queue: "_stdlib_queue.SimpleQueue[dict]" = _stdlib_queue.SimpleQueue()
+        self._overflow: dict[str, dict] = {}
+        self._rfd, self._wfd = os.pipe()
+        os.set_blocking(self._rfd, False)
+        os.set_blocking(self._wfd, False)
+        # True while a wake byte is outstanding — coalesces wake-ups during bursts so
+        # the producer does at most one os.write per dispatcher wake.
+        self._armed = False
+        self.high_water = 0               # deepest backlog seen since start
+        self.dropped = 0                  # ticks superseded in the overflow by a newer tick
+        self.overflow_episodes = 0        # times the queue filled up (dispatcher starvation)
+
+    def wake(self) -> None:
+        """Wake the dispatcher without a tick, e.g. to flush batch updates queued outside it."""
+        if not self._armed:
+            self._armed = True
+            try:
+                os.write(self._wfd, b"\0")
+            except BlockingIOError:
+                pass  # pipe full: a wake-up is already pending
+
+    def put(self, item: dict) -> None:
+        if self._overflow or (self.maxsize and self._queue.qsize() >= self.maxsize):
+            key = item.get("stock_code") or item.get("stock_name") or item.get("symbol") or ""
+            if "depth" in item:
+                key = f"depth:{key}"   # a symbol's depth tick must not replace its quote tick
+            if not self._overflow:
+                self.overflow_episodes += 1
+                logger.warning(f"[dispatcher] Tick queue full ({self.maxsize}) — dispatcher starved; "
+                               f"keeping newest tick per symbol until it catches up.")
+            if key in self._overflow:
+                self.dropped += 1
+            self._overflow[key] = item
+        else:
+            self._queue.put(item)
+        depth = self.qsize()
+        if depth > self.high_water:
+            self.high_water = depth
+        self.wake()
+
+    def get_nowait(self) -> dict:
+        try:
+            return self._queue.get_nowait()
+        except _stdlib_queue.Empty:
+            try:
+                return self._overflow.popitem()[1]
+            except KeyError:
+                raise _stdlib_queue.Empty from None
+
+    def qsize(self) -> int:
+        return self._queue.qsize() + len(self._overflow)
 
-# Thread-safe queue: Breeze's WebSocket reader thread puts raw ticks here;
-# the _run_tick_dispatcher greenlet drains the queue and calls socketio.emit.
-# This bridges Breeze's native/green thread context to the Flask-SocketIO event loop.
-_tick_dispatch_queue: "_stdlib_queue.SimpleQueue[dict]" = _stdlib_queue.SimpleQueue()
+    def wait(self, timeout=None) -> None:
+        """
+        Park the calling greenlet until put() signals or `timeout` seconds elapse.
+        Returns immediately if ticks are already queued.
+        """
+        # Disarm before the emptiness check: a put() racing with us either lands in the
+        # queue before the check, or sees _armed=False and writes a wake byte.
+        self._armed = False
+        if not self._queue.empty() or self._overflow:
+            return
+        try:
+            trampoline(self._rfd, read=True, timeout=timeout, timeout_exc=_EventletTimeout)
+        except _EventletTimeout:
+            return
+        # Single read only: the pipe is readable now, and under eventlet's monkey-patched os
+        # a second read on the drained pipe would park this greenlet instead of raising EAGAIN.
+        # Wake bytes are coalesced via _armed, so one read clears them in practice; a stray
+        # leftover byte only causes one harmless spurious wake.
+        os.read(self._rfd, 4096)
+
+
+# Maximum queued ticks before _tick_dispatch_queue falls back to newest-per-symbol (0 = unbounded).
+TICK_QUEUE_MAXSIZE = max(0, int(os.environ.get("TICK_QUEUE_MAXSIZE", "5000")))
+
+# Breeze's WebSocket reader thread puts raw ticks here; the _run_tick_dispatcher greenlet
+# blocks on the channel and calls socketio.emit.  This bridges Breeze's native/green thread
+# context to the Flask-SocketIO event loop.
+_tick_dispatch_queue = _TickChannel(TICK_QUEUE_MAXSIZE)
 _tick_dispatcher_started: bool = False
 
+# --- Tick capture (TICK_RECORD_PATH) ---
+# When set, _global_on_ticks appends every raw Breeze tick to a memory-mapped capture file
+# for offline replay (bench_tick_replay.py): an 8-byte magic, then records of
+# <u32 payload length><f64 epoch seconds><JSON payload>.  The file grows by doubling and is
+# truncated to its used length on exit; after a crash the zero-filled tail ends the read.
+TICK_RECORD_PATH = os.environ.get("TICK_RECORD_PATH", "")
+_TICK_RECORD_MAGIC = b"BRZTICK1"
+_TICK_RECORD_HEADER = struct.Struct("<Id")
+
+
+class _TickRecorder:
+    """Length-prefixed tick capture into a growable mmap (safe to call from Breeze's reader thread)."""
+
+    def __init__(self, path: str, initial_bytes: int = 16 * 1024 * 1024):
+        self._file = open(path, "w+b")
+        self._file.truncate(initial_bytes)
+        self._map = mmap.mmap(self._file.fileno(), initial_bytes)
+        self._map[:len(_TICK_RECORD_MAGIC)] = _TICK_RECORD_MAGIC
+        self._offset = len(_TICK_RECORD_MAGIC)
+        self._lock = threading.Lock()
+        self.records = 0
+        atexit.register(self.close)
+
+    def write(self, tick: dict, at: float = None) -> None:
+        data = json.dumps(tick, default=str, separators=(",", ":")).encode()
+        need = _TICK_RECORD_HEADER.size + len(data)
+        with self._lock:
+            if self._map is None:
+                return
+            if self._offset + need > len(self._map):
+                self._grow(self._offset + need)
+            _TICK_RECORD_HEADER.pack_into(self._map, self._offset, len(data), time.time() if at is None else at)
+            start = self._offset + _TICK_RECORD_HEADER.size
+            self._map[start:start + len(data)] = data
+            self._offset = start + len(data)
+            self.records += 1
+
+    def _grow(self, minimum: int) -> None:
+        size = max(len(self._map) * 2, minimum)
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is None:
+                return
+            self._map.flush()
+            self._map.close()
+            self._map = None
+            self._file.truncate(self._offset)
+            self._file.close()
+
+
+def iter_tick_recording(path: str):
+    """Yield (epoch seconds, raw tick dict) from a _TickRecorder capture file."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:len(_TICK_RECORD_MAGIC)] != _TICK_RECORD_MAGIC:
+            raise ValueError(f"{path} is not a tick capture file")
+        offset = len(_TICK_RECORD_MAGIC)
+        while offset + _TICK_RECORD_HEADER.size <= len(data):
+            length, at = _TICK_RECORD_HEADER.unpack_from(data, offset)
+            if not length:
+                break
+            start = offset + _TICK_RECORD_HEADER.size
+            yield at, json.loads(data[start:start + length])
+            offset = start + length
+
+
+_tick_recorder = _TickRecorder(TICK_RECORD_PATH) if TICK_RECORD_PATH else None
+
+# Per-symbol conflation window (ms) between _tick_dispatch_queue and _dispatch_tick.
+# Within one window only the latest tick per symbol is emitted — Breeze ticks are full
+# quotes (cumulative volume, day high/low), so intermediate ticks carry nothing the last
+# one doesn't.  Keeps slow browser clients and Socket.IO write buffers from backing up
+# during busy sessions.  0 disables conflation (every tick is emitted as it arrives).
+TICK_CONFLATION_MS = max(0, int(os.environ.get("TICK_CONFLATION_MS", "100")))
+
+# Dispatcher counters exposed at /api/breeze/stream/stats.
+#   ticks_received — ticks dequeued from _tick_dispatch_queue
+#   ticks_dropped  — ticks superseded by a newer tick for the same symbol in a window
+#   ticks_emitted  — ticks normalized and emitted to subscribers
+_tick_stream_stats: dict[str, int] = {"ticks_received": 0, "ticks_dropped": 0, "ticks_emitted": 0}
+
+
+class _Histogram:
+    """Minimal cumulative Prometheus-style histogram (seconds) — no client library needed."""
+
+    def __init__(self, buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: dict):
+        """(metric_name, labels, value) triples in Prometheus exposition order."""
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += n
+            yield f"{name}_bucket", {**labels, "le": "+Inf" if bound == float("inf") else repr(bound)}, cumulative
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+# Per-stage tick latency, stamped in _global_on_ticks (received), _run_tick_dispatcher
+# (dequeued) and after socketio.emit returns in _dispatch_tick.  Published at /api/metrics.
+#   queue      — received → dequeued (time waiting in _tick_dispatch_queue)
+#   conflation — dequeued → dispatch start (time held in the conflation window)
+#   emit       — dispatch start → emit returned (normalize + delta + Socket.IO emit)
+#   end_to_end — received → emit returned
+_tick_latency: dict[str, _Histogram] = {
+    stage: _Histogram() for stage in ("queue", "conflation", "emit", "end_to_end")
+}
+_symbol_tick_counts: dict[str, int] = {}   # symbol -> ticks received from Breeze
+
 # Per-symbol cache of the correct previous-day closing price, populated by the REST
 # get_quotes() initial snapshot.  Breeze exchange-quote WebSocket ticks for indices (e.g.
 # NIFTY) use `close` = the index value from the previous *second*, not yesterday's session
@@ -109,6 +431,500 @@ _tick_dispatcher_started: bool = False
 # rather than the real daily move.  By caching the correct previous_close from the REST
 # snapshot we can recompute the proper daily change/% for every subsequent WebSocket tick.
 _symbol_prev_close: dict[str, float] = {}
+# Last bulk preload of _symbol_prev_close (see _preload_prev_closes), for /api/breeze/stream/stats.
+_prev_close_preload: dict = {"symbols": 0, "loaded": 0, "seconds": 0.0, "finished_at": None}
+
+# --- Snapshot-plus-delta watchlist protocol (opt-in: subscribe_to_watchlist protocol="delta") ---
+# normalize_tick_for_frontend returns the raw tick plus ~20 derived fields, several of them
+# duplicates (ltp/last_traded_price, volume/total_quantity_traded, ...).  Delta clients instead
+# get one `watchlist_snapshot` {symbol, seq, quote} per symbol, then `watchlist_delta`
+# {symbol, seq, changes} events carrying only the _DELTA_FIELDS that changed.  `seq` increases
+# by 1 per delta for that symbol; a client that sees a gap emits `watchlist_resync` and gets a
+# fresh snapshot.  Deltas with seq <= the snapshot's seq are already reflected in it.
+_DELTA_FIELDS = (
+    "ltp", "change", "percent_change", "previous_close", "volume",
+    "open", "high", "low",
+    "best_bid_price", "best_bid_quantity", "best_offer_price", "best_offer_quantity",
+)
+_delta_state: dict[str, dict] = {}      # symbol -> latest compact quote (_DELTA_FIELDS only)
+_delta_seq: dict[str, int] = {}         # symbol -> sequence number of the latest delta
+_delta_registry: dict[str, set] = {}    # symbol -> SIDs using the delta protocol (subset of _tick_registry)
+
+# --- Batched emits (opt-in: subscribe_to_watchlist batch=True) ---
+# Batch SIDs are kept out of the per-symbol rooms; _dispatch_tick (or, for delta SIDs,
+# _publish_delta) appends their updates to _batch_pending and _flush_batches sends one
+# event per SID per dispatcher cycle:
+# `watchlist_batch` [watchlist_update payloads] or, with protocol="delta",
+# `watchlist_delta_batch` [watchlist_delta payloads].  One frame / websocket write per client
+# per cycle instead of one per symbol.
+_batch_registry: dict[str, set] = {}    # symbol -> batch-mode SIDs (disjoint from the room members)
+_batch_protocol: dict[str, str] = {}    # batch-mode SID -> "full" | "delta"
+_batch_pending: dict[str, list] = {}    # SID -> updates collected in the current dispatcher cycle
+
+# --- Latest-quote store ---
+# Normalized quote per frontend symbol, updated from WebSocket ticks (_dispatch_tick) and REST
+# snapshots.  New watchlist subscribers and /api/breeze/quotes are served from here when the
+# entry is fresh, so REST get_quotes is only called for symbols with nothing recent.
+# An entry is fresh if it is younger than QUOTE_STORE_MAX_AGE_S, or if it was written while
+# the symbol's Breeze feed was live (any later trade would have arrived as a tick).
+QUOTE_STORE_MAX_AGE_S = float(os.environ.get("QUOTE_STORE_MAX_AGE_S", "5"))
+_latest_quotes: dict[str, tuple] = {}   # symbol -> (monotonic updated_at, normalized payload)
+_feed_live_since: dict[str, float] = {}  # symbol -> monotonic time its Breeze feed was (re)subscribed
+
+# --- Quote micro-cache (/api/breeze/quotes misses) ---
+# Below the latest-quote store (NSE symbols only), raw get_quotes responses are kept for
+# QUOTE_CACHE_TTL_S per (stock_code, exchange_code), and concurrent misses for one key share a
+# single in-flight Breeze call (_cached_get_quotes), so dashboards loading together cost one call.
+QUOTE_CACHE_TTL_S = max(0.0, float(os.environ.get("QUOTE_CACHE_TTL_S", "1.0")))
+_quote_cache: dict[tuple, tuple] = {}      # (stock_code, exchange_code) -> (monotonic fetched_at, response)
+_quote_inflight: dict[tuple, _Event] = {}  # key -> Event sent with the leader's response (or exception)
+_quote_cache_stats: dict[str, int] = {"store_hits": 0, "hits": 0, "misses": 0, "coalesced": 0}
+QUOTE_BATCH_MAX_SYMBOLS = max(1, int(os.environ.get("QUOTE_BATCH_MAX_SYMBOLS", "200")))   # /api/breeze/quotes/batch
+_quote_batch_stats: dict[str, int] = {"requests": 0, "symbols": 0, "errors": 0}
+
+# --- Streaming L2 market depth (opt-in: subscribe_to_watchlist depth=True) ---
+# Depth SIDs also get Breeze's market-depth feed for their symbols, reference-counted per
+# code like the quote feeds.  Each symbol's book is a _DepthBook of preallocated 5-level
+# arrays updated in place by the dispatcher; once per dispatcher cycle the symbol's depth
+# room gets one `market_depth` event {symbol, seq, levels} carrying only the levels that
+# changed.  /api/breeze/depth answers from the book while it is fresh (same rule as
+# _latest_quotes) instead of calling get_market_depth2.
+DEPTH_LEVELS = 5
+_depth_books: dict[str, "_DepthBook"] = {}   # symbol -> live book
+_depth_dirty: dict[str, set] = {}            # symbol -> levels changed in the current dispatcher cycle
+_depth_registry: dict[str, set] = {}         # symbol -> SIDs in its depth room
+_depth_refcounts: dict[str, int] = {}        # breeze_code -> SIDs holding its depth feed
+_sid_depth_feeds: dict[str, set] = {}        # sid -> breeze_codes whose depth feed it holds
+_depth_token_symbols: dict[str, str] = {}    # Breeze depth token (e.g. "4.2!2885") -> frontend symbol
+_depth_live_since: dict[str, float] = {}     # symbol -> monotonic time its depth feed was (re)subscribed
+_depth_stats: dict[str, int] = {"ticks": 0, "events": 0, "rest_served_from_book": 0, "rest_fallbacks": 0}
+
+
+class _DepthBook:
+    """One symbol's 5-level book: six doubles per level in a single preallocated array."""
+
+    FIELDS = ("bid_price", "bid_quantity", "bid_orders", "ask_price", "ask_quantity", "ask_orders")
+    # Breeze depth-feed keys per level, in FIELDS order ("BestBuyRate-1", ...).
+    KEYS = [tuple(f"{name}-{n}" for name in ("BestBuyRate", "BestBuyQty", "BuyNoOfOrders",
+                                              "BestSellRate", "BestSellQty", "SellNoOfOrders"))
+            for n in range(1, DEPTH_LEVELS + 1)]
+    __slots__ = ("values", "updated_at", "seq")
+
+    def __init__(self):
+        self.values = array("d", bytes(8 * len(self.FIELDS) * DEPTH_LEVELS))
+        self.updated_at = 0.0
+        self.seq = 0
+
+    def apply(self, depth) -> list:
+        """
+        Write a Breeze depth list (the full book) into the book in place; return the 1-based
+        levels that changed.  Levels the update leaves out are cleared, not kept stale.
+        """
+        changed = []
+        width = len(self.FIELDS)
+        for i in range(DEPTH_LEVELS):
+            level = depth[i] if i < len(depth) else {}
+            base, dirty = i * width, False
+            for j, key in enumerate(self.KEYS[i]):
+                value = to_float(level.get(key))
+                if self.values[base + j] != value:
+                    self.values[base + j] = value
+                    dirty = True
+            if dirty:
+                changed.append(i + 1)
+        self.updated_at = time.monotonic()
+        return changed
+
+    def level(self, n: int) -> dict:
+        width = len(self.FIELDS)
+        return {"level": n, **dict(zip(self.FIELDS, self.values[(n - 1) * width:n * width]))}
+
+    def snapshot(self) -> dict:
+        """Full book in the /api/breeze/depth shape (best bid/offer plus every level)."""
+        return {
+            "best_bid_price": self.values[0], "best_bid_quantity": self.values[1],
+            "best_offer_price": self.values[3], "best_offer_quantity": self.values[4],
+            "depth": [self.level(n) for n in range(1, DEPTH_LEVELS + 1)],
+        }
+
+
+# --- Global Breeze REST scheduler ---
+# breeze_client is a _ScheduledBreezeClient: every Breeze REST call takes a token from one
+# process-wide bucket of BREEZE_RATE_PER_S calls/s (burst BREEZE_BURST).  Callers queue in
+# strict-priority lanes — interactive (HTTP handlers, the default), snapshot (watchlist
+# bootstraps, batch quotes), background (prev-close preload, reconnect gap fill) — and the
+# lower lanes also leave BREEZE_LANE_RESERVE tokens untouched, so under load background work
+# slows down first and interactive calls last.  A greenlet picks its lane with _breeze_lane().
+# SNAPSHOT_RATE_PER_S / SNAPSHOT_BURST (the old snapshot-only budget) are honoured as fallbacks.
+BREEZE_RATE_PER_S = max(0.1, float(os.environ.get("BREEZE_RATE_PER_S", os.environ.get("SNAPSHOT_RATE_PER_S", "5"))))
+BREEZE_BURST = max(1.0, float(os.environ.get("BREEZE_BURST", os.environ.get("SNAPSHOT_BURST", "10"))))
+BREEZE_LANES = ("interactive", "snapshot", "background")
+BREEZE_LANE_RESERVE = (0.0, 1.0, 3.0)   # tokens each lane must leave in the bucket
+BREEZE_REST_METHODS = frozenset({
+    "generate_session", "get_customer_details", "get_quotes", "get_option_chain_quotes",
+    "get_historical_data", "get_historical_data_v2", "get_market_depth2", "get_names",
+    "get_funds", "get_margin", "get_demat_holdings", "get_portfolio_holdings", "get_portfolio_positions",
+})
+_breeze_lane_local = _greenlet_local()
+
+
+class _TokenBucket:
+    """Green-thread token bucket: acquire() sleeps cooperatively until a token is available."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, reserve: float = 0.0) -> bool:
+        """Take a token only if `reserve` more would still be left; never blocks."""
+        self._refill()
+        if self.tokens >= 1 + reserve:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, reserve: float = 0.0) -> float:
+        """Seconds until try_acquire(reserve) can succeed."""
+        self._refill()
+        return max(0.0, (1 + reserve - self.tokens) / self.rate)
+
+    def acquire(self) -> None:
+        while not self.try_acquire():
+            eventlet.sleep(self.wait_time())
+
+
+class _BreezeScheduler:
+    """
+    Process-wide Breeze REST budget (see BREEZE_RATE_PER_S): one _TokenBucket shared by
+    strict-priority lanes.  A caller takes a token immediately only if no caller of the same
+    or a higher lane is already queued; otherwise it queues and a single granter greenlet
+    hands tokens to the head of the highest non-empty lane.  Lanes below the first must also
+    leave their BREEZE_LANE_RESERVE tokens in the bucket, keeping burst headroom for
+    interactive calls.
+    """
+
+    def __init__(self, rate: float, burst: float, lanes=BREEZE_LANES, reserve=BREEZE_LANE_RESERVE):
+        self.bucket = _TokenBucket(rate, burst)
+        self.lanes = lanes
+        self.reserve = [min(r, burst - 1) for r in reserve]
+        self.waiting = [deque() for _ in lanes]
+        self.queue_time = {lane: _Histogram(buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+                           for lane in lanes}
+        self.calls = dict.fromkeys(lanes, 0)
+        self._granting = False
+        self._wake = _Event()
+
+    def acquire(self, lane: str = "interactive") -> None:
+        index = self.lanes.index(lane)
+        started = time.monotonic()
+        if not any(self.waiting[:index + 1]) and self.bucket.try_acquire(self.reserve[index]):
+            self.queue_time[lane].observe(0.0)
+            self.calls[lane] += 1
+            return
+        granted = _Event()
+        self.waiting[index].append(granted)
+        if not self._granting:
+            self._granting = True
+            eventlet.spawn_n(self._grant)
+        elif not self._wake.ready():
+            self._wake.send()   # a higher lane may now be first in line
+        granted.wait()
+        self.queue_time[lane].observe(time.monotonic() - started)
+        self.calls[lane] += 1
+
+    def _grant(self) -> None:
+        try:
+            while True:
+                index = next((i for i, q in enumerate(self.waiting) if q), None)
+                if index is None:
+                    return
+                if self.bucket.try_acquire(self.reserve[index]):
+                    self.waiting[index].popleft().send()
+                    continue
+                with _EventletTimeout(self.bucket.wait_time(self.reserve[index]), False):
+                    self._wake.wait()
+                if self._wake.ready():
+                    self._wake = _Event()
+        finally:
+            self._granting = False
+
+
+class _ScheduledBreezeClient:
+    """
+    Wraps a BreezeConnect client so every REST call in BREEZE_REST_METHODS first waits for
+    the global _breeze_scheduler, in the calling greenlet's lane (see _breeze_lane).
+    Websocket methods and attributes (on_ticks, session_key, ...) pass straight through.
+    """
+
+    def __init__(self, client):
+        object.__setattr__(self, "_client", client)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in BREEZE_REST_METHODS:
+            return attr
+
+        def scheduled(*args, **kwargs):
+            _breeze_scheduler.acquire(getattr(_breeze_lane_local, "lane", "interactive"))
+            return attr(*args, **kwargs)
+        return scheduled
+
+    def __setattr__(self, name, value):
+        setattr(self._client, name, value)
+
+
+@contextlib.contextmanager
+def _breeze_lane(lane: str):
+    """Run this greenlet's Breeze REST calls in `lane` (greenlets spawned inside do not inherit it)."""
+    previous = getattr(_breeze_lane_local, "lane", "interactive")
+    _breeze_lane_local.lane = lane
+    try:
+        yield
+    finally:
+        _breeze_lane_local.lane = previous
+
+
+# --- Server-side price alerts (Socket.IO alert_add / alert_remove) ---
+# Rules live per symbol in an _AlertBook of parallel numpy columns, so a tick evaluates only
+# its own symbol's rules, as one vectorized pass (dispatcher loop -> _evaluate_alerts, before
+# conflation so every tick is checked).
+# Every kind is edge-triggered against the previous evaluated tick:
+#   above / below     — ltp crosses `threshold` upward / downward
+#   pct_move          — |percent_change| crosses `threshold`
+#   cross_prev_close  — ltp crosses the previous close in either direction
+#   cross_day_high    — ltp breaks above the day high seen before this tick
+#   volume_spike      — traded-volume increase since the previous tick is >= `threshold` x its
+#                       running average (EWMA) increase
+# Matches go to the owning SID as `price_alert`.  Rules are one-shot unless added with
+# repeat=True, and are dropped when their SID disconnects.
+ALERT_KINDS = ("above", "below", "pct_move", "cross_prev_close", "cross_day_high", "volume_spike")
+ALERT_MAX_RULES_PER_SID = int(os.environ.get("ALERT_MAX_RULES_PER_SID", "1000"))
+_ALERT_DIRECTION = np.array([1, 2, 1, 3, 1, 1], dtype=np.int8)   # 1 = upward cross, 2 = downward, 3 = either
+_ALERT_DYNAMIC_LEVEL = np.array([False, False, False, True, True, False])   # level comes from the tick, not the rule
+_alert_books: dict[str, "_AlertBook"] = {}   # symbol -> its rules
+_alert_symbols: dict[int, str] = {}          # rule id -> symbol
+_sid_alerts: dict[str, set] = {}             # sid -> rule ids it owns
+_alert_ids = itertools.count(1)
+_alert_stats: dict[str, int] = {"evaluations": 0, "fired": 0}
+
+
+class _AlertBook:
+    """One symbol's alert rules as parallel numpy columns (rows [0, size) are live), plus the
+    previous-tick state the edge-triggered comparisons need."""
+
+    __slots__ = ("ids", "kinds", "thresholds", "repeat", "armed", "sids", "size",
+                 "last_price", "last_pct", "last_high", "last_volume", "volume_ewma")
+
+    def __init__(self, capacity: int = 8):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.kinds = np.zeros(capacity, dtype=np.int8)
+        self.thresholds = np.zeros(capacity, dtype=np.float64)
+        self.repeat = np.zeros(capacity, dtype=bool)
+        self.armed = np.zeros(capacity, dtype=bool)
+        self.sids = [None] * capacity
+        self.size = 0
+        self.last_price = self.last_pct = self.last_high = self.last_volume = math.nan
+        self.volume_ewma = 0.0
+
+    def add(self, rule_id: int, kind: int, threshold: float, repeat: bool, sid: str) -> None:
+        if self.size == len(self.ids):
+            for name in ("ids", "kinds", "thresholds", "repeat", "armed"):
+                column = getattr(self, name)
+                setattr(self, name, np.concatenate([column, np.zeros_like(column)]))
+            self.sids.extend([None] * len(self.sids))
+        i = self.size
+        self.ids[i], self.kinds[i], self.thresholds[i] = rule_id, kind, threshold
+        self.repeat[i], self.armed[i], self.sids[i] = repeat, True, sid
+        self.size += 1
+
+    def remove(self, rule_id: int) -> bool:
+        """Delete a rule by moving the last live row into its slot."""
+        hits = np.flatnonzero(self.ids[:self.size] == rule_id)
+        if not len(hits):
+            return False
+        i, last = int(hits[0]), self.size - 1
+        for column in (self.ids, self.kinds, self.thresholds, self.repeat, self.armed):
+            column[i] = column[last]
+        self.sids[i], self.sids[last] = self.sids[last], None
+        self.size = last
+        return True
+
+    def evaluate(self, price: float, pct: float, prev_close: float, high: float, volume: float):
+        """Evaluate every live rule against one tick; returns (fired row indices, per-row levels)."""
+        n = self.size
+        volume_step = volume - self.last_volume
+        spike = volume_step / self.volume_ewma if self.volume_ewma > 0 and volume_step > 0 else math.nan
+        # Per-kind current/previous value and tick-derived level, indexed by the kinds column.
+        now = np.array([price, price, abs(pct), price, price, spike])
+        before = np.array([self.last_price, self.last_price, abs(self.last_pct),
+                           self.last_price, self.last_price, 0.0])
+        dynamic = np.array([math.nan, math.nan, math.nan, prev_close if prev_close > 0 else math.nan,
+                            np.nextafter(self.last_high, math.inf), math.nan])
+        kinds = self.kinds[:n]
+        cur, prev = now[kinds], before[kinds]
+        levels = np.where(_ALERT_DYNAMIC_LEVEL[kinds], dynamic[kinds], self.thresholds[:n])
+        direction = _ALERT_DIRECTION[kinds]
+        up = (direction & 1).astype(bool) & (prev < levels) & (cur >= levels)
+        down = (direction & 2).astype(bool) & (prev > levels) & (cur <= levels)
+        fired = np.flatnonzero(self.armed[:n] & (up | down))
+        self.armed[fired] = self.repeat[fired]
+
+        if volume_step > 0:
+            self.volume_ewma = volume_step if self.volume_ewma <= 0 else 0.9 * self.volume_ewma + 0.1 * volume_step
+        self.last_price, self.last_pct, self.last_volume = price, pct, volume
+        self.last_high = max(high, price) if math.isnan(self.last_high) else max(self.last_high, high, price)
+        return fired, levels
+
+
+# --- Intraday 1-minute bars built from the tick stream ---
+# The dispatcher rolls every tick into its symbol's _MinuteBars ring before conflation, so
+# ticks conflated away still shape the bar (one numpy record per minute,
+# INTRADAY_BAR_CAPACITY minutes — a full 09:15–15:30 session fits).  Bars reset when
+# the first tick of a new IST day arrives.  /api/breeze/intraday serves them directly and
+# /api/breeze/historical answers same-day 1minute requests from them when the symbol has
+# been tracked since the open.  After the close, _run_intraday_flusher upserts the day's
+# finished bars into the Supabase INTRADAY_CANDLES_TABLE once.
+INTRADAY_BAR_CAPACITY = max(60, int(os.environ.get("INTRADAY_BAR_CAPACITY", "420")))
+INTRADAY_CANDLES_TABLE = os.environ.get("INTRADAY_CANDLES_TABLE", "intraday_candles")
+_MINUTE_BAR_DTYPE = np.dtype([("minute", "i8"), ("open", "f8"), ("high", "f8"),
+                              ("low", "f8"), ("close", "f8"), ("volume", "f8")])
+_minute_bars: dict[str, "_MinuteBars"] = {}   # symbol -> today's bars
+_intraday_flush_state: dict = {"flushed_date": None, "rows": 0, "failures": 0}
+
+
+class _MinuteBars:
+    """Fixed-capacity ring of 1-minute OHLCV records for one symbol (oldest overwritten first)."""
+
+    __slots__ = ("bars", "start", "count", "session_date", "last_volume")
+
+    def __init__(self, capacity: int = INTRADAY_BAR_CAPACITY):
+        self.bars = np.zeros(capacity, dtype=_MINUTE_BAR_DTYPE)
+        self.start = 0
+        self.count = 0
+        self.session_date = None
+        self.last_volume = math.nan   # cumulative traded volume at the previous tick
+
+    def reset(self, session_date) -> None:
+        self.start = self.count = 0
+        self.session_date = session_date
+        self.last_volume = math.nan
+
+    def update(self, minute: int, price: float, cumulative_volume: float) -> None:
+        """Fold one tick into the bar for `minute` (epoch seconds at the minute start)."""
+        step = cumulative_volume - self.last_volume if cumulative_volume >= self.last_volume else 0.0
+        if cumulative_volume > 0:
+            self.last_volume = cumulative_volume
+        bars, capacity = self.bars, len(self.bars)
+        if self.count:
+            i = (self.start + self.count - 1) % capacity
+            last_minute = bars["minute"][i]
+            if minute < last_minute:
+                return   # late tick for a bar that is already closed
+            if minute == last_minute:
+                bars["high"][i] = max(bars["high"][i], price)
+                bars["low"][i] = min(bars["low"][i], price)
+                bars["close"][i] = price
+                bars["volume"][i] += step
+                return
+        i = (self.start + self.count) % capacity
+        if self.count == capacity:
+            self.start = (self.start + 1) % capacity
+        else:
+            self.count += 1
+        bars[i] = (minute, price, price, price, price, step)
+
+    def ordered(self) -> np.ndarray:
+        """Live bars, oldest first (a copy)."""
+        return self.bars[(self.start + np.arange(self.count)) % len(self.bars)]
+
+
+# --- Intraday tick history (GET /api/breeze/ticks) ---
+# Every quote tick the dispatcher dequeues (before conflation) is appended to its symbol's
+# _TickHistory: ms offset from the symbol's first tick of the day (uint32), price change in
+# paise from the previous tick (int32) and traded-volume step (uint32) — 12 bytes per tick
+# in stdlib arrays.  When the total passes TICK_HISTORY_MAX_MB, the symbol with the most
+# ticks drops its oldest quarter, so memory stays bounded while recent history survives.
+TICK_HISTORY_MAX_MB = max(1.0, float(os.environ.get("TICK_HISTORY_MAX_MB", "64")))
+_tick_history: dict[str, "_TickHistory"] = {}   # symbol -> today's ticks
+_tick_history_bytes = 0
+_tick_history_stats: dict[str, int] = {"ticks": 0, "trimmed": 0}
+
+
+class _TickHistory:
+    """Append-only, delta-encoded ticks for one symbol and IST day."""
+
+    BYTES_PER_TICK = 12
+    __slots__ = ("session_date", "base_ms", "base_paise", "last_paise", "last_volume",
+                 "offsets", "price_deltas", "volume_steps")
+
+    def __init__(self, session_date, base_ms: int, price_paise: int):
+        self.session_date = session_date
+        self.base_ms = base_ms              # epoch ms of offset 0
+        self.base_paise = price_paise       # price before the first stored delta
+        self.last_paise = price_paise
+        self.last_volume = math.nan
+        self.offsets = array("I")
+        self.price_deltas = array("i")
+        self.volume_steps = array("I")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, epoch_ms: int, price_paise: int, cumulative_volume: float) -> None:
+        offset = max(epoch_ms - self.base_ms, self.offsets[-1] if self.offsets else 0)
+        step = cumulative_volume - self.last_volume if cumulative_volume >= self.last_volume else 0.0
+        if cumulative_volume > 0:
+            self.last_volume = cumulative_volume
+        self.offsets.append(min(offset, 0xFFFFFFFF))
+        self.price_deltas.append(max(-0x7FFFFFFF, min(price_paise - self.last_paise, 0x7FFFFFFF)))
+        self.volume_steps.append(int(min(step, 0xFFFFFFFF)))
+        self.last_paise = price_paise
+
+    def trim(self, count: int) -> None:
+        """Drop the oldest `count` ticks, folding their deltas into the base price."""
+        self.base_paise += sum(self.price_deltas[:count])
+        del self.offsets[:count]
+        del self.price_deltas[:count]
+        del self.volume_steps[:count]
+
+    def query(self, start_ms: int = None, end_ms: int = None, limit: int = None):
+        """(epoch ms, price in rupees, volume step) columns for ticks in [start_ms, end_ms]."""
+        offsets = np.frombuffer(self.offsets, dtype=np.uint32).astype(np.int64)
+        lo = 0 if start_ms is None else int(np.searchsorted(offsets, start_ms - self.base_ms, "left"))
+        hi = len(offsets) if end_ms is None else int(np.searchsorted(offsets, end_ms - self.base_ms, "right"))
+        if limit is not None and hi - lo > limit:
+            lo = hi - limit   # keep the most recent ticks of the range
+        deltas = np.frombuffer(self.price_deltas, dtype=np.int32).astype(np.int64)
+        prices = (self.base_paise + np.cumsum(deltas))[lo:hi] / 100.0
+        volumes = np.frombuffer(self.volume_steps, dtype=np.uint32)[lo:hi]
+        return offsets[lo:hi] + self.base_ms, prices, volumes
+
+
+# --- Watchlist bootstrap (initial REST snapshot in track_watchlist) ---
+# Snapshot get_quotes calls run in a GreenPool of SNAPSHOT_CONCURRENCY greenlets in the
+# Breeze scheduler's "snapshot" lane, and each quote is emitted as soon as it arrives.
+SNAPSHOT_CONCURRENCY = max(1, int(os.environ.get("SNAPSHOT_CONCURRENCY", "5")))
+_bootstrap_latency = _Histogram(buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0))
+_bootstrap_stats: dict[str, int] = {"quotes_from_store": 0, "quotes_from_rest": 0, "rest_failures": 0}
+_breeze_scheduler = _BreezeScheduler(BREEZE_RATE_PER_S, BREEZE_BURST)
+
+# --- On-disk historical OHLC cache ---
+# A finished daily candle never changes, so /api/breeze/historical, analyze_stock and the
+# prev-close preload read candles through _cached_historical(): one NPZ file per
+# (exchange, symbol, interval) under HISTORICAL_CACHE_DIR holding the candle columns plus
+# the inclusive day ranges already fetched.  Only the uncovered gaps go to Breeze.  Days from
+# today on are never recorded as covered (today's candle is still forming), so that tail is
+# fetched live every time.  Files are replaced atomically, so workers can share the directory.
+HISTORICAL_CACHE_DIR = os.environ.get("HISTORICAL_CACHE_DIR", "/tmp/breeze-historical")   # "" disables
+HISTORICAL_CACHE_INTERVALS = ("1day",)
+_historical_cache_stats: dict[str, int] = {"hits": 0, "partial": 0, "misses": 0, "gap_fetches": 0}
 
 
 # ─────────────────────────────────────────────
@@ -122,6 +938,12 @@ def home():
         "endpoints": [
             "/api/breeze/health",
             "/api/breeze/quotes",
+            "/api/breeze/quotes/batch",
+            "/api/breeze/quotes/latest",
+            "/api/breeze/intraday",
+            "/api/breeze/ticks",
+            "/api/breeze/stream/stats",
+            "/api/metrics",
             "/api/gemini/summarize_market_outlook",
             "/api/gemini/stock-deep-dive",
             "/api/stockinsights/announcements",
@@ -163,7 +985,7 @@ def initialize_breeze():
             if not api_key:
                 logger.error("BREEZE_API_KEY is missing!")
                 return None
-            breeze_client = BreezeConnect(api_key=api_key)
+            breeze_client = _ScheduledBreezeClient(BreezeConnect(api_key=api_key))
             logger.info("BreezeConnect initialized.")
         except Exception as e:
             logger.error(f"Breeze initialization error: {e}")
@@ -236,6 +1058,24 @@ def get_ist_now():
     return datetime.datetime.now(pytz.timezone('Asia/Kolkata'))
 
 
+_IST_UTC_OFFSET_S = 19800          # IST is a fixed UTC+05:30 (no DST), so per-tick code can skip pytz
+_ist_date_cache = [None, None]     # [IST day number, datetime.date] from the last _ist_date() call
+
+
+def _ist_date(epoch: float) -> datetime.date:
+    """IST calendar date of a Unix timestamp; the tick-path equivalent of get_ist_now().date()."""
+    day = (int(epoch) + _IST_UTC_OFFSET_S) // 86400
+    if day != _ist_date_cache[0]:
+        _ist_date_cache[:] = [day, datetime.date(1970, 1, 1) + datetime.timedelta(days=day)]
+    return _ist_date_cache[1]
+
+
+def is_market_open(now=None):
+    """NSE cash session: 09:15–15:30 IST, Monday–Friday (exchange holidays not considered)."""
+    now = now or get_ist_now()
+    return now.weekday() < 5 and datetime.time(9, 15) <= now.time() <= datetime.time(15, 30)
+
+
 def extract_json(text):
     try:
         first_brace = text.find('{')
@@ -373,65 +1213,1326 @@ def _global_on_ticks(ticks):
     The _run_tick_dispatcher background greenlet drains the queue and does the actual emit
     from within the Flask-SocketIO event loop where socketio.emit() works correctly.
     """
+    global _last_tick_at, _tick_recorder
     if ticks:
+        if _tick_recorder is not None:
+            try:
+                _tick_recorder.write(ticks)
+            except Exception as e:
+                logger.error(f"[dispatcher] Tick capture stopped: {e}")
+                _tick_recorder = None
         logger.debug(f"[on_ticks] Tick received: stock_code={ticks.get('stock_code')!r} last={ticks.get('last')!r}")
-        _tick_dispatch_queue.put(dict(ticks))
+        tick = dict(ticks)
+        tick["_received_at"] = _last_tick_at = time.monotonic()   # popped again in _dispatch_tick
+        _tick_dispatch_queue.put(tick)
+
+
+def _resolve_tick_symbol(ticks: dict) -> str:
+    """Resolve a Breeze tick's stock_code to the canonical frontend symbol."""
+    raw = ticks.get("stock_code") or ticks.get("stock_name") or ticks.get("symbol") or ""
+    # Breeze sometimes sends stock_code in token format: "4.1!NIFTY" or "1!NIFTY"
+    token_match = re.match(r"^\d+\.?\d*!(.+)$", str(raw))
+    if token_match:
+        raw = token_match.group(1)
+    return _registry_symbol_map.get(canonical_symbol(raw)) or canonical_symbol(raw)
+
+
+def _dispatch_tick(ticks: dict, resolved: str = None) -> None:
+    """
+    Resolve the Breeze tick's stock_code to the frontend symbol and emit
+    a watchlist_update event to all subscribed Socket.IO SIDs.
+
+    Runs from the _run_tick_dispatcher greenlet — safe to call socketio.emit() here.
+    """
+    started_at = time.monotonic()
+    received_at = ticks.pop("_received_at", None)
+    dequeued_at = ticks.pop("_dequeued_at", None)
+    if resolved is None:
+        resolved = _resolve_tick_symbol(ticks)
+    if ticks.pop("_bus", False):
+        payload = ticks   # already normalized (and published) by the feed owner's dispatcher
+    else:
+        payload = normalize_tick_for_frontend(ticks, resolved)
+    _tick_stream_stats["ticks_emitted"] += 1
+    _store_quote(resolved, payload)
+
+    _publish_delta(resolved, payload)
+
+    for sid in _batch_registry.get(resolved, ()):
+        if _batch_protocol.get(sid) != "delta":   # batch-delta SIDs are fed by _publish_delta
+            _batch_pending.setdefault(sid, []).append(payload)
+
+    throttled = 0
+    for interval_ms, tier in _throttle_registry.get(resolved, {}).items():
+        if tier:
+            throttled += len(tier)
+            _emit_throttled(resolved, interval_ms, payload, started_at)
+
+    full_subscribers = (len(_tick_registry.get(resolved, ())) - len(_delta_registry.get(resolved, ()))
+                        - len(_batch_registry.get(resolved, ())) - throttled)
+    if full_subscribers > 0:
+        logger.debug(f"[dispatch] symbol={resolved!r} ltp={payload.get('ltp')} subscribers={full_subscribers}")
+        try:
+            socketio.emit('watchlist_update', payload, to=_tick_room(resolved), namespace='/')
+        except Exception as e:
+            logger.error(f"Tick dispatch error {resolved}: {e}")
+
+    emitted_at = time.monotonic()
+    _tick_latency["emit"].observe(emitted_at - started_at)
+    if dequeued_at is not None:
+        _tick_latency["conflation"].observe(started_at - dequeued_at)
+    if received_at is not None:
+        _tick_latency["end_to_end"].observe(emitted_at - received_at)
+
+
+def _emit_throttled(symbol: str, interval_ms: int, payload: dict, now: float) -> None:
+    """
+    Emit to a throttled tier if its interval has elapsed, else hold the payload for _flush_throttled.
+    The tier's batch-mode SIDs get the update through _batch_pending; the rest through its room.
+    """
+    key = (symbol, interval_ms)
+    if now - _throttle_last_emit.get(key, 0.0) < interval_ms / 1000.0:
+        _throttle_pending[key] = payload
+        return
+    _throttle_pending.pop(key, None)
+    _throttle_last_emit[key] = now
+    room_members = False
+    for sid in _throttle_registry.get(symbol, {}).get(interval_ms, ()):
+        if sid in _batch_protocol:
+            _batch_pending.setdefault(sid, []).append(payload)
+        else:
+            room_members = True
+    if not room_members:
+        return
+    try:
+        socketio.emit('watchlist_update', payload, to=_throttled_room(symbol, interval_ms), namespace='/')
+    except Exception as e:
+        logger.error(f"Throttled dispatch error {symbol}@{interval_ms}ms: {e}")
+
+
+def _flush_throttled() -> float:
+    """Send held updates whose interval has elapsed; returns the next due time (0.0 if none held)."""
+    if not _throttle_pending:
+        return 0.0
+    now = time.monotonic()
+    next_due = 0.0
+    for key, payload in list(_throttle_pending.items()):
+        symbol, interval_ms = key
+        due = _throttle_last_emit.get(key, 0.0) + interval_ms / 1000.0
+        if due <= now:
+            if _throttle_registry.get(symbol, {}).get(interval_ms):
+                _emit_throttled(symbol, interval_ms, payload, now)
+            else:
+                _throttle_pending.pop(key, None)
+        elif not next_due or due < next_due:
+            next_due = due
+    return next_due
+
+
+def _publish_delta(symbol: str, payload: dict, skip_sid: str = None):
+    """
+    Fold a normalized quote into the symbol's compact delta state and, when any field
+    changed, bump its sequence number and send the delta to every delta subscriber: emitted
+    as `watchlist_delta` to the delta room, queued in _batch_pending for batch-delta SIDs.
+    `skip_sid` (a SID about to receive the state as its bootstrap snapshot) is left out; the
+    bootstrap paths that pass it run outside the dispatcher, so they wake it to flush the queue.
+    State is kept current even with no delta subscribers so later snapshots are correct.
+    Returns the watchlist_delta payload, or None when nothing changed.
+    """
+    prev = _delta_state.get(symbol)
+    quote = {k: payload.get(k) for k in _DELTA_FIELDS}
+    if prev is None:
+        changes = quote
+    else:
+        changes = {k: v for k, v in quote.items() if prev.get(k) != v}
+        if not changes:
+            return None
+    _delta_state[symbol] = quote
+    seq = _delta_seq.get(symbol, 0) + 1
+    _delta_seq[symbol] = seq
+    delta = {"symbol": symbol, "seq": seq, "changes": changes}
+    if _delta_registry.get(symbol):
+        try:
+            socketio.emit('watchlist_delta', delta, to=_delta_room(symbol), skip_sid=skip_sid, namespace='/')
+        except Exception as e:
+            logger.error(f"Delta dispatch error {symbol}: {e}")
+    queued = False
+    for sid in _batch_registry.get(symbol, ()):
+        if sid != skip_sid and _batch_protocol.get(sid) == "delta":
+            _batch_pending.setdefault(sid, []).append(delta)
+            queued = True
+    if queued and skip_sid is not None:
+        _tick_dispatch_queue.wake()
+    return delta
+
+
+def _store_quote(symbol: str, payload: dict) -> None:
+    _latest_quotes[symbol] = (time.monotonic(), payload)
+    if _quote_board is not None and _quote_board.writable:
+        _quote_board.write(symbol, payload)
+
+
+def _cached_get_quotes(client, stock_code: str, exchange_code: str):
+    """
+    Normalized get_quotes response for (stock_code, exchange_code) as (response, source): from the
+    TTL micro-cache ("cache"), from an identical call already in flight ("coalesced"), or from
+    Breeze ("breeze").  Breeze errors reach the leader and every coalesced waiter alike.
+    """
+    key = (canonical_symbol(stock_code), exchange_code)
+    entry = _quote_cache.get(key)
+    if entry is not None and time.monotonic() - entry[0] <= QUOTE_CACHE_TTL_S:
+        _quote_cache_stats["hits"] += 1
+        return entry[1], "cache"
+    pending = _quote_inflight.get(key)
+    if pending is not None:
+        _quote_cache_stats["coalesced"] += 1
+        return pending.wait(), "coalesced"
+
+    _quote_cache_stats["misses"] += 1
+    done = _quote_inflight[key] = _Event()
+    try:
+        res = client.get_quotes(stock_code=stock_code, exchange_code=exchange_code, product_type="cash")
+        normalized = normalize_breeze_response(res)
+    except Exception as e:
+        done.send_exception(e)
+        raise
+    finally:
+        _quote_inflight.pop(key, None)
+    if normalized and not (isinstance(res, dict) and res.get("Error") and not res.get("Success")):
+        now = time.monotonic()
+        if len(_quote_cache) >= 4096:
+            for stale in [k for k, (at, _) in _quote_cache.items() if now - at > QUOTE_CACHE_TTL_S]:
+                del _quote_cache[stale]
+        _quote_cache[key] = (now, normalized)
+    done.send(normalized)
+    return normalized, "breeze"
+
+
+def _fresh_quote(symbol: str, max_age: float = None):
+    """
+    Stored normalized quote for `symbol` if it is still fresh (see _latest_quotes), else None.
+    Web workers fall back to the shared quote board, which also covers other workers' symbols.
+    """
+    if max_age is None:
+        max_age = QUOTE_STORE_MAX_AGE_S
+    entry = _latest_quotes.get(symbol)
+    if entry is not None:
+        updated_at, payload = entry
+        live_since = _feed_live_since.get(symbol)
+        if time.monotonic() - updated_at <= max_age or (live_since is not None and updated_at >= live_since):
+            return payload
+    if _quote_board is not None and not _quote_board.writable:
+        return _quote_board.fresh(symbol, max_age)
+    return None
+
+
+def _record_tick_history(symbol: str, ticks: dict, now: float) -> None:
+    """Append a raw Breeze tick received at epoch `now` to the symbol's _TickHistory, trimming if over budget."""
+    global _tick_history_bytes
+    price = to_float(ticks.get("last", ticks.get("ltp")))
+    if price <= 0:
+        return
+    epoch_ms = int(now * 1000)
+    paise = int(round(price * 100))
+    session_date = _ist_date(now)
+    history = _tick_history.get(symbol)
+    if history is None or history.session_date != session_date:
+        if history is not None:
+            _tick_history_bytes -= len(history) * _TickHistory.BYTES_PER_TICK
+        history = _tick_history[symbol] = _TickHistory(session_date, epoch_ms, paise)
+    history.append(epoch_ms, paise, to_float(ticks.get("ttq", ticks.get("total_quantity_traded",
+                                                                         ticks.get("volume")))))
+    _tick_history_stats["ticks"] += 1
+    _tick_history_bytes += _TickHistory.BYTES_PER_TICK
+    if _tick_history_bytes > TICK_HISTORY_MAX_MB * 1024 * 1024:
+        largest = max(_tick_history.values(), key=len)
+        dropped = max(1, len(largest) // 4)
+        largest.trim(dropped)
+        _tick_history_bytes -= dropped * _TickHistory.BYTES_PER_TICK
+        _tick_history_stats["trimmed"] += dropped
+
+
+def _record_minute_bar(symbol: str, ticks: dict, now: float) -> None:
+    """Roll a raw Breeze tick received at epoch `now` into the symbol's current 1-minute bar."""
+    price = to_float(ticks.get("last", ticks.get("ltp")))
+    if price <= 0:
+        return
+    session_date = _ist_date(now)
+    bars = _minute_bars.get(symbol)
+    if bars is None:
+        bars = _minute_bars[symbol] = _MinuteBars()
+    if bars.session_date != session_date:
+        bars.reset(session_date)
+    volume = to_float(ticks.get("ttq", ticks.get("total_quantity_traded", ticks.get("volume"))))
+    bars.update(int(now) // 60 * 60, price, volume)
+
+
+def _intraday_rows(symbol: str, start: float = None, end: float = None) -> list:
+    """A symbol's bars as Breeze-style historical rows, optionally limited to [start, end] epoch seconds."""
+    bars = _minute_bars.get(symbol)
+    if bars is None or not bars.count:
+        return []
+    data = bars.ordered()
+    if start is not None:
+        data = data[data["minute"] >= start]
+    if end is not None:
+        data = data[data["minute"] <= end]
+    ist = pytz.timezone('Asia/Kolkata')
+    return [{
+        "datetime": datetime.datetime.fromtimestamp(int(minute), ist).strftime("%Y-%m-%d %H:%M:%S"),
+        "stock_code": symbol, "exchange_code": "NSE", "interval": "1minute",
+        "open": float(o), "high": float(h), "low": float(l), "close": float(c), "volume": float(v),
+    } for minute, o, h, l, c, v in data.tolist()]
+
+
+def _intraday_covers_session(symbol: str) -> bool:
+    """True if the symbol's bars start at the session open of today (nothing missing before them)."""
+    bars = _minute_bars.get(symbol)
+    now = get_ist_now()
+    if bars is None or not bars.count or bars.session_date != now.date():
+        return False
+    session_open = now.replace(hour=9, minute=15, second=0, microsecond=0)
+    return int(bars.ordered()["minute"][0]) <= int(session_open.timestamp()) + 60
+
+
+def _flush_intraday_bars() -> None:
+    """Upsert today's finished bars for every symbol into INTRADAY_CANDLES_TABLE."""
+    if not supabase:
+        initialize_supabase()
+    if not supabase:
+        logger.error("[intraday] Supabase not initialized; bars not persisted.")
+        _intraday_flush_state["failures"] += 1
+        return
+    today = get_ist_now().date()
+    current_minute = int(get_ist_now().timestamp()) // 60 * 60
+    rows = []
+    for symbol, bars in list(_minute_bars.items()):
+        if bars.session_date != today:
+            continue
+        rows.extend({k: row[k] for k in ("stock_code", "datetime", "interval", "open", "high", "low", "close", "volume")}
+                    for row in _intraday_rows(symbol, end=current_minute - 60))
+    written = 0
+    for i in range(0, len(rows), 500):
+        chunk = rows[i:i + 500]
+        try:
+            supabase.table(INTRADAY_CANDLES_TABLE).upsert(chunk, on_conflict='stock_code,interval,datetime').execute()
+            written += len(chunk)
+        except Exception as e:
+            _intraday_flush_state["failures"] += 1
+            logger.error(f"[intraday] Bar flush failed ({len(chunk)} rows): {e}")
+    _intraday_flush_state.update({"flushed_date": str(today), "rows": written})
+    logger.info(f"[intraday] Persisted {written}/{len(rows)} 1-minute bars for {today}.")
+
+
+def _run_intraday_flusher():
+    """Background greenlet: persist the day's bars once, shortly after the 15:30 close."""
+    while True:
+        socketio.sleep(60)
+        now = get_ist_now()
+        if (now.weekday() < 5 and now.time() >= datetime.time(15, 31) and _minute_bars
+                and _intraday_flush_state["flushed_date"] != str(now.date())):
+            _flush_intraday_bars()
+
+
+def _add_alert(sid: str, symbol: str, kind: str, threshold: float, repeat: bool) -> int:
+    """Register a rule for `sid`; the symbol's book is seeded from the quote store."""
+    book = _alert_books.get(symbol)
+    if book is None:
+        book = _alert_books[symbol] = _AlertBook()
+        entry = _latest_quotes.get(symbol)
+        if entry is not None:
+            quote = entry[1]
+            book.last_price = to_float(quote.get("ltp"), math.nan)
+            book.last_pct = to_float(quote.get("percent_change"), math.nan)
+            book.last_high = to_float(quote.get("high"), math.nan) or math.nan
+            book.last_volume = to_float(quote.get("volume"), math.nan)
+    rule_id = next(_alert_ids)
+    book.add(rule_id, ALERT_KINDS.index(kind), threshold, repeat, sid)
+    _alert_symbols[rule_id] = symbol
+    _sid_alerts.setdefault(sid, set()).add(rule_id)
+    return rule_id
+
+
+def _remove_alert(rule_id: int) -> bool:
+    symbol = _alert_symbols.pop(rule_id, None)
+    book = _alert_books.get(symbol)
+    if book is None or not book.remove(rule_id):
+        return False
+    if not book.size:
+        _alert_books.pop(symbol, None)
+    return True
+
+
+def _remove_sid_alerts(sid: str) -> None:
+    for rule_id in _sid_alerts.pop(sid, ()):
+        _remove_alert(rule_id)
+
+
+def _evaluate_alerts(symbol: str, payload: dict) -> None:
+    """Run the symbol's alert rules against a normalized tick and emit price_alert per match."""
+    book = _alert_books[symbol]
+    price = to_float(payload.get("ltp"))
+    if price <= 0:
+        return
+    _alert_stats["evaluations"] += 1
+    fired, levels = book.evaluate(price, to_float(payload.get("percent_change")),
+                                  to_float(payload.get("previous_close")), to_float(payload.get("high")),
+                                  to_float(payload.get("volume")))
+    if not len(fired):
+        return
+    triggered_at = get_ist_now().isoformat()
+    spent = []
+    for i in fired:
+        rule_id, sid = int(book.ids[i]), book.sids[i]
+        alert = {
+            "id": rule_id, "symbol": symbol, "kind": ALERT_KINDS[book.kinds[i]],
+            "threshold": float(book.thresholds[i]), "level": float(levels[i]), "ltp": price,
+            "percent_change": payload.get("percent_change"), "volume": payload.get("volume"),
+            "repeat": bool(book.repeat[i]), "triggered_at": triggered_at,
+        }
+        try:
+            socketio.emit('price_alert', alert, to=sid, namespace='/')
+        except Exception as e:
+            logger.error(f"Alert dispatch error {symbol} -> {sid}: {e}")
+        if not book.repeat[i]:
+            spent.append((sid, rule_id))
+    _alert_stats["fired"] += len(fired)
+    for sid, rule_id in spent:   # one-shot rules are done; removal reorders rows, so do it last
+        _sid_alerts.get(sid, set()).discard(rule_id)
+        _remove_alert(rule_id)
+
+
+def _apply_depth_tick(ticks: dict) -> None:
+    """Update a symbol's _DepthBook from a Breeze depth tick and mark the changed levels."""
+    symbol = _depth_token_symbols.get(ticks.get("symbol")) or _resolve_tick_symbol(ticks)
+    if _tick_bus is not None and _tick_bus.is_owner and not ticks.get("_bus"):
+        _tick_bus.publish({"op": "depth", "stock_code": symbol, "depth": ticks.get("depth") or []})
+    book = _depth_books.get(symbol)
+    if book is None:
+        book = _depth_books[symbol] = _DepthBook()
+    _depth_stats["ticks"] += 1
+    changed = book.apply(ticks.get("depth") or [])
+    if changed:
+        _depth_dirty.setdefault(symbol, set()).update(changed)
+
+
+def _flush_depth() -> None:
+    """Send each depth room the levels that changed in this dispatcher cycle."""
+    if not _depth_dirty:
+        return
+    dirty = dict(_depth_dirty)
+    _depth_dirty.clear()
+    for symbol, levels in dirty.items():
+        book = _depth_books[symbol]
+        book.seq += 1
+        if not _depth_registry.get(symbol):
+            continue
+        event = {"symbol": symbol, "seq": book.seq, "levels": [book.level(n) for n in sorted(levels)]}
+        try:
+            socketio.emit('market_depth', event, to=_depth_room(symbol), namespace='/')
+            _depth_stats["events"] += 1
+        except Exception as e:
+            logger.error(f"Depth dispatch error {symbol}: {e}")
+
+
+def _fresh_depth(symbol: str, max_age: float = None):
+    """Live _DepthBook for `symbol` if it is fresh (same rule as _fresh_quote), else None."""
+    book = _depth_books.get(symbol)
+    if book is None or not book.updated_at:
+        return None
+    if max_age is None:
+        max_age = QUOTE_STORE_MAX_AGE_S
+    live_since = _depth_live_since.get(symbol)
+    if time.monotonic() - book.updated_at <= max_age or (live_since is not None and book.updated_at >= live_since):
+        return book
+    return None
+
+
+def _flush_batches() -> None:
+    """Send each batch-mode SID everything collected for it in this dispatcher cycle."""
+    if not _batch_pending:
+        return
+    pending = dict(_batch_pending)
+    _batch_pending.clear()
+    for sid, updates in pending.items():
+        event = 'watchlist_delta_batch' if _batch_protocol.get(sid) == "delta" else 'watchlist_batch'
+        try:
+            socketio.emit(event, updates, to=sid, namespace='/')
+        except Exception as e:
+            logger.error(f"Batch dispatch error -> {sid}: {e}")
+
+
+def _delta_snapshot(symbol: str):
+    """Full compact quote for a delta-protocol client, or None if nothing is known yet."""
+    quote = _delta_state.get(symbol)
+    if quote is None:
+        return None
+    return {"symbol": symbol, "seq": _delta_seq.get(symbol, 0), "quote": dict(quote)}
+
+
+def _run_tick_dispatcher():
+    """
+    Flask-SocketIO background task (eventlet greenlet) that drains _tick_dispatch_queue
+    and calls _dispatch_tick for each tick.
+
+    Runs for the lifetime of the server. Blocks on the channel's self-pipe between bursts,
+    so it costs no CPU when the market is quiet and adds no polling delay when it is busy.
+
+    With TICK_CONFLATION_MS > 0, ticks are held per symbol (latest wins) and flushed once
+    the window opened by the first pending tick has elapsed; the channel wait is bounded
+    by the time left in that window.
+    """
+    logger.info(f"[dispatcher] Tick dispatcher started (conflation={TICK_CONFLATION_MS} ms).")
+    window = TICK_CONFLATION_MS / 1000.0
+    pending: dict[str, dict] = {}   # resolved symbol -> latest tick in the current window
+    flush_at = 0.0
+    throttle_due = 0.0              # next held rate-limited update (see _flush_throttled)
+    while True:
+        deadline = min(flush_at, throttle_due) if pending and throttle_due else (
+            flush_at if pending else throttle_due)
+        _tick_dispatch_queue.wait(max(0.0, deadline - time.monotonic()) if deadline else None)
+        # Drain all pending ticks before parking again.
+        while True:
+            try:
+                ticks = _tick_dispatch_queue.get_nowait()
+            except _stdlib_queue.Empty:
+                break
+            _tick_stream_stats["ticks_received"] += 1
+            now = time.monotonic()
+            wall = time.time()
+            ticks["_dequeued_at"] = now
+            if "_received_at" in ticks:
+                _tick_latency["queue"].observe(now - ticks["_received_at"])
+            if "depth" in ticks:
+                _apply_depth_tick(ticks)
+                continue
+            resolved = _resolve_tick_symbol(ticks)
+            _symbol_tick_counts[resolved] = _symbol_tick_counts.get(resolved, 0) + 1
+            _record_tick_history(resolved, ticks, wall)
+            _record_minute_bar(resolved, ticks, wall)
+            if _tick_bus is not None and _tick_bus.is_owner and not ticks.get("_bus"):
+                # Publish every tick before conflation: peers conflate it once, in their own
+                # window, and record the same tick history as the owner.
+                payload = normalize_tick_for_frontend({k: v for k, v in ticks.items() if k[0] != "_"}, resolved)
+                _tick_bus.publish({"op": "tick", "payload": payload})
+                ticks = dict(payload, _bus=True, _received_at=ticks.get("_received_at"), _dequeued_at=now)
+            if resolved in _alert_books:
+                # Before conflation too, so a crossing that reverses within the window still fires.
+                _evaluate_alerts(resolved, ticks if ticks.get("_bus") else normalize_tick_for_frontend(ticks, resolved))
+            if window <= 0:
+                _dispatch_tick(ticks, resolved)
+                continue
+            if resolved in pending:
+                _tick_stream_stats["ticks_dropped"] += 1
+            elif not pending:
+                flush_at = time.monotonic() + window
+            pending[resolved] = ticks
+
+        if pending and time.monotonic() >= flush_at:
+            flushing, pending = pending, {}
+            for resolved, ticks in flushing.items():
+                _dispatch_tick(ticks, resolved)
+        throttle_due = _flush_throttled()
+        _flush_depth()
+        _flush_batches()
+        socketio.sleep(0)  # cooperative yield so HTTP handlers / heartbeats run between bursts
+
+
+def _tick_room(symbol: str) -> str:
+    """Socket.IO room name for a canonical frontend symbol."""
+    return f"tick:{symbol}"
+
+
+def _delta_room(symbol: str) -> str:
+    """Socket.IO room name for delta-protocol subscribers of a symbol."""
+    return f"delta:{symbol}"
+
+
+def _depth_room(symbol: str) -> str:
+    """Socket.IO room name for market-depth subscribers of a symbol."""
+    return f"depth:{symbol}"
+
+
+def _throttled_room(symbol: str, interval_ms: int) -> str:
+    """Socket.IO room for full-protocol SIDs receiving a symbol at most once per interval_ms."""
+    return f"tick:{symbol}@{interval_ms}"
+
+
+def _register_tick_sid(symbol: str, sid: str, protocol: str = "full", batch: bool = False,
+                       depth: bool = False, interval_ms: int = 0) -> None:
+    """
+    Add a SID to the symbol's registry entry and join it to the symbol's room
+    (batch-mode SIDs are tracked in _batch_registry instead of a room; rate-limited
+    full-protocol SIDs join a throttled room, or just its _throttle_registry tier when
+    they are batch-mode), plus the symbol's depth room when `depth` is set.
+    """
+    _tick_registry.setdefault(symbol, set()).add(sid)
+    _sid_symbols.setdefault(sid, set()).add(symbol)
+    # server.enter_room works outside a request context (track_watchlist runs as a background task).
+    if depth:
+        _depth_registry.setdefault(symbol, set()).add(sid)
+        socketio.server.enter_room(sid, _depth_room(symbol), namespace='/')
+    if batch:
+        _batch_protocol[sid] = protocol
+    if batch and (protocol == "delta" or interval_ms <= 0):
+        _batch_registry.setdefault(symbol, set()).add(sid)
+    elif protocol == "delta":
+        _delta_registry.setdefault(symbol, set()).add(sid)
+        socketio.server.enter_room(sid, _delta_room(symbol), namespace='/')
+    elif interval_ms > 0:
+        # Rate-limited batch SIDs share the tier's gate; _emit_throttled queues their updates.
+        _throttle_registry.setdefault(symbol, {}).setdefault(interval_ms, set()).add(sid)
+        if not batch:
+            socketio.server.enter_room(sid, _throttled_room(symbol, interval_ms), namespace='/')
+    else:
+        socketio.server.enter_room(sid, _tick_room(symbol), namespace='/')
+
+
+def _unregister_tick_sid(symbol: str, sid: str) -> None:
+    """Remove a SID from one symbol's registry entry and leave that symbol's room."""
+    sym_sids = _tick_registry.get(symbol)
+    if not sym_sids or sid not in sym_sids:
+        return
+    sym_sids.discard(sid)
+    if sid in _depth_registry.get(symbol, ()):
+        _depth_registry[symbol].discard(sid)
+        try:
+            socketio.server.leave_room(sid, _depth_room(symbol), namespace='/')
+        except Exception:
+            pass
+    if sid in _batch_registry.get(symbol, ()):
+        _batch_registry[symbol].discard(sid)
+        return
+    for interval_ms, tier in _throttle_registry.get(symbol, {}).items():
+        if sid in tier:
+            tier.discard(sid)
+            try:
+                socketio.server.leave_room(sid, _throttled_room(symbol, interval_ms), namespace='/')
+            except Exception:
+                pass
+            return
+    is_delta = sid in _delta_registry.get(symbol, ())
+    if is_delta:
+        _delta_registry[symbol].discard(sid)
+    try:
+        socketio.server.leave_room(sid, _delta_room(symbol) if is_delta else _tick_room(symbol), namespace='/')
+    except Exception:
+        pass  # Socket.IO already dropped the SID's rooms on disconnect
+
+
+def _unregister_sid(sid: str) -> None:
+    """Remove a disconnected SID from all registry entries and their rooms."""
+    _batch_protocol.pop(sid, None)
+    _batch_pending.pop(sid, None)
+    _sid_options.pop(sid, None)
+    for symbol in _sid_symbols.pop(sid, ()):
+        _unregister_tick_sid(symbol, sid)
+
+
+def _ensure_breeze_ws(client) -> None:
+    """Connect the Breeze WebSocket once and route its ticks to _global_on_ticks."""
+    global _breeze_ws_connected
+    if _breeze_ws_connected:
+        return
+    global _feed_connected_at
+    client.on_ticks = _global_on_ticks
+    try:
+        client.ws_connect()
+        logger.info("Breeze WebSocket connected")
+    except Exception as e:
+        # ws_connect raises if already connected; safe to continue.
+        logger.warning(f"ws_connect: {e}")
+    _breeze_ws_connected = True
+    _feed_connected_at = time.monotonic()
+
+
+def _acquire_feed(client, sid: str, breeze_code: str, symbol: str) -> bool:
+    """
+    Take a reference on `breeze_code` for `sid` (idempotent per SID).  Subscribes the
+    Breeze feed only on the 0→1 transition.  Returns False if that subscribe failed.
+    """
+    held = _sid_feeds.setdefault(sid, set())
+    if breeze_code in held:
+        return True
+    # Count the reference before subscribing: subscribe_feeds yields to the hub, and a
+    # concurrent acquire for the same code must not subscribe it a second time.
+    count = _feed_refcounts.get(breeze_code, 0) + 1
+    _feed_refcounts[breeze_code] = count
+    held.add(breeze_code)
+    if count > 1:
+        return True
+    try:
+        if _tick_bus is not None and not _tick_bus.is_owner:
+            _tick_bus.send({"op": "acquire", "code": breeze_code, "symbol": symbol})
+        else:
+            _ensure_breeze_ws(client)
+            client.subscribe_feeds(
+                exchange_code="NSE",
+                stock_code=breeze_code,
+                product_type="cash",
+                get_exchange_quotes=True,
+                get_market_depth=False
+            )
+    except Exception as e:
+        logger.error(f"Failed to subscribe to {symbol} ({breeze_code}): {e}")
+        held.discard(breeze_code)
+        _feed_refcounts[breeze_code] -= 1
+        if _feed_refcounts[breeze_code] <= 0:
+            _feed_refcounts.pop(breeze_code, None)
+        return False
+    _subscribed_breeze_codes.add(breeze_code)
+    _feed_symbols[breeze_code] = symbol
+    _feed_live_since[symbol] = time.monotonic()
+    logger.info(f"Subscribed to feed: {symbol} → Breeze code '{breeze_code}'")
+    return True
+
+
+def _acquire_depth_feed(client, sid: str, breeze_code: str, symbol: str) -> bool:
+    """
+    Take a reference on the market-depth feed of `breeze_code` for `sid`; same contract
+    as _acquire_feed (the SID must already hold the code's quote feed).
+    """
+    held = _sid_depth_feeds.setdefault(sid, set())
+    if breeze_code in held:
+        return True
+    count = _depth_refcounts.get(breeze_code, 0) + 1
+    _depth_refcounts[breeze_code] = count
+    held.add(breeze_code)
+    if count > 1:
+        return True
+    if _tick_bus is not None and not _tick_bus.is_owner:
+        _tick_bus.send({"op": "acquire_depth", "code": breeze_code, "symbol": symbol})
+        _depth_live_since[symbol] = time.monotonic()
+        return True
+    try:
+        client.subscribe_feeds(
+            exchange_code="NSE",
+            stock_code=breeze_code,
+            product_type="cash",
+            get_exchange_quotes=False,
+            get_market_depth=True
+        )
+    except Exception as e:
+        logger.error(f"Failed to subscribe to depth for {symbol} ({breeze_code}): {e}")
+        held.discard(breeze_code)
+        _depth_refcounts[breeze_code] -= 1
+        if _depth_refcounts[breeze_code] <= 0:
+            _depth_refcounts.pop(breeze_code, None)
+        return False
+    # Depth ticks carry only the Breeze token and company name; map the token back.
+    try:
+        _, depth_token = client.get_stock_token_value(
+            exchange_code="NSE", stock_code=breeze_code, product_type="cash",
+            get_exchange_quotes=False, get_market_depth=True)
+        if depth_token:
+            _depth_token_symbols[depth_token] = symbol
+    except Exception as e:
+        logger.warning(f"Depth token lookup failed for {symbol} ({breeze_code}): {e}")
+    _depth_live_since[symbol] = time.monotonic()
+    logger.info(f"Subscribed to depth feed: {symbol} → Breeze code '{breeze_code}'")
+    return True
+
+
+def _release_depth_feeds(sid: str, breeze_codes=None) -> None:
+    """Drop `sid`'s depth-feed references (all, or only `breeze_codes`); unsubscribe codes at zero."""
+    if breeze_codes is None:
+        codes = _sid_depth_feeds.pop(sid, set())
+    else:
+        held = _sid_depth_feeds.get(sid, set())
+        codes = held.intersection(breeze_codes)
+        held.difference_update(codes)
+    client = breeze_client
+    for breeze_code in codes:
+        count = _depth_refcounts.get(breeze_code, 0) - 1
+        if count > 0:
+            _depth_refcounts[breeze_code] = count
+            continue
+        _depth_refcounts.pop(breeze_code, None)
+        symbol = _feed_symbols.get(breeze_code, breeze_code)
+        _depth_live_since.pop(symbol, None)
+        if _tick_bus is not None and not _tick_bus.is_owner:
+            _tick_bus.send({"op": "release_depth", "code": breeze_code})
+            continue
+        if client is None:
+            continue
+        try:
+            client.unsubscribe_feeds(
+                exchange_code="NSE",
+                stock_code=breeze_code,
+                product_type="cash",
+                get_exchange_quotes=False,
+                get_market_depth=True
+            )
+            logger.info(f"Unsubscribed depth feed (no more subscribers): {symbol} ({breeze_code})")
+        except Exception as e:
+            logger.error(f"Error unsubscribing depth for {symbol}: {e}")
+
+
+def _release_sid_feeds(sid: str, breeze_codes=None) -> None:
+    """
+    Drop the feed references held by `sid` (all of them, or only `breeze_codes`);
+    unsubscribe codes that reach zero and disconnect the Breeze WebSocket once no
+    feeds remain.
+    """
+    global _breeze_ws_connected
+    _release_depth_feeds(sid, breeze_codes)   # before the quote feeds: _feed_symbols is still populated
+    if breeze_codes is None:
+        codes = _sid_feeds.pop(sid, set())
+    else:
+        held = _sid_feeds.get(sid, set())
+        codes = held.intersection(breeze_codes)
+        held.difference_update(codes)
+    client = breeze_client
+    for breeze_code in codes:
+        count = _feed_refcounts.get(breeze_code, 0) - 1
+        if count > 0:
+            _feed_refcounts[breeze_code] = count
+            continue
+        _feed_refcounts.pop(breeze_code, None)
+        symbol = _feed_symbols.pop(breeze_code, breeze_code)
+        _feed_live_since.pop(symbol, None)
+        if _quote_board is not None and _quote_board.writable:
+            _quote_board.mark_not_live(symbol)
+        _subscribed_breeze_codes.discard(breeze_code)
+        if _tick_bus is not None and not _tick_bus.is_owner:
+            _tick_bus.send({"op": "release", "code": breeze_code})
+            continue
+        if client is None:
+            continue
+        try:
+            client.unsubscribe_feeds(
+                exchange_code="NSE",
+                stock_code=breeze_code,
+                product_type="cash",
+                get_exchange_quotes=True,
+                get_market_depth=False
+            )
+            logger.info(f"Unsubscribed feed (no more subscribers): {symbol} ({breeze_code})")
+        except Exception as e:
+            logger.error(f"Error unsubscribing {symbol}: {e}")
+
+    if codes and not _feed_refcounts and _breeze_ws_connected and client is not None:
+        _breeze_ws_connected = False
+        try:
+            client.ws_disconnect()
+            logger.info("Breeze WebSocket disconnected — no more subscribers")
+        except Exception as e:
+            logger.error(f"Error disconnecting WebSocket: {e}")
+
+
+def _reconnect_breeze_feed(client) -> bool:
+    """
+    Tear down and re-open the Breeze WebSocket, then resubscribe every code that still
+    has references.  Returns True when the connection is back and at least one feed
+    (or no feed at all) was resubscribed.
+    """
+    global _breeze_ws_connected, _feed_connected_at
+    try:
+        client.ws_disconnect()
+    except Exception:
+        pass
+    _breeze_ws_connected = False
+    client.on_ticks = _global_on_ticks
+    try:
+        client.ws_connect()
+    except Exception as e:
+        logger.error(f"[feed] Reconnect failed: {e}")
+        return False
+    _breeze_ws_connected = True
+    _feed_connected_at = time.monotonic()
+
+    codes = list(_feed_refcounts)
+    resubscribed = 0
+    for breeze_code in codes:
+        try:
+            client.subscribe_feeds(
+                exchange_code="NSE",
+                stock_code=breeze_code,
+                product_type="cash",
+                get_exchange_quotes=True,
+                get_market_depth=False
+            )
+            resubscribed += 1
+            symbol = _feed_symbols.get(breeze_code, breeze_code)
+            _feed_live_since[symbol] = time.monotonic()
+        except Exception as e:
+            logger.error(f"[feed] Resubscribe failed for {breeze_code}: {e}")
+    for breeze_code in list(_depth_refcounts):
+        try:
+            client.subscribe_feeds(
+                exchange_code="NSE",
+                stock_code=breeze_code,
+                product_type="cash",
+                get_exchange_quotes=False,
+                get_market_depth=True
+            )
+            _depth_live_since[_feed_symbols.get(breeze_code, breeze_code)] = time.monotonic()
+        except Exception as e:
+            logger.error(f"[feed] Depth resubscribe failed for {breeze_code}: {e}")
+    logger.info(f"[feed] Breeze WebSocket reconnected; resubscribed {resubscribed}/{len(codes)} feeds.")
+    return resubscribed > 0 or not codes
+
+
+def _fill_feed_gap(client, breeze_codes) -> None:
+    """
+    After a reconnect, fetch one REST quote per affected code (pooled, in the background
+    Breeze lane) and push it through _tick_dispatch_queue so every subscriber,
+    the quote store and delta state catch up on what was missed.
+    """
+    def fetch(breeze_code):
+        try:
+            with _breeze_lane("background"):
+                raw = normalize_breeze_response(client.get_quotes(
+                    stock_code=breeze_code, exchange_code="NSE", product_type="cash"))
+            if isinstance(raw, list):
+                raw = raw[0] if raw else None
+            if raw and isinstance(raw, dict):
+                tick = dict(raw)
+                tick.setdefault("stock_code", breeze_code)
+                _tick_dispatch_queue.put(tick)
+                _feed_supervisor_stats["gap_fill_quotes"] += 1
+        except Exception as e:
+            logger.warning(f"[feed] Gap-fill quote failed for {breeze_code}: {e}")
+
+    pool = eventlet.GreenPool(SNAPSHOT_CONCURRENCY)
+    for breeze_code in breeze_codes:
+        pool.spawn_n(fetch, breeze_code)
+    pool.waitall()
+
+
+def _run_feed_supervisor():
+    """
+    Background greenlet: detects a stalled Breeze WebSocket (no ticks for
+    FEED_STALL_SECONDS while feeds are active in market hours) and reconnects it with
+    exponential backoff, resubscribing the active set and gap-filling via REST.
+    """
+    logger.info(f"[feed] Supervisor started (stall after {FEED_STALL_SECONDS:.0f}s without ticks).")
+    backoff = 1.0
+    # A watchlist of illiquid names can legitimately stay silent; if a reconnect brings no
+    # ticks either, double the stall threshold (up to 8x) until a tick arrives.
+    quiet_factor = 1
+    tick_at_last_reconnect = None
+    while True:
+        socketio.sleep(min(5.0, FEED_STALL_SECONDS / 2))
+        client = breeze_client
+        if (not _feed_refcounts or client is None or not client.session_key or not is_market_open()
+                or (_tick_bus is not None and not _tick_bus.is_owner)):
+            backoff = 1.0
+            continue
+        if tick_at_last_reconnect is not None and _last_tick_at != tick_at_last_reconnect:
+            quiet_factor, tick_at_last_reconnect = 1, None
+        silent_for = time.monotonic() - max(_last_tick_at, _feed_connected_at)
+        if silent_for < FEED_STALL_SECONDS * quiet_factor:
+            backoff = 1.0
+            continue
+
+        _feed_supervisor_stats["stalls_detected"] += 1
+        logger.warning(f"[feed] No Breeze ticks for {silent_for:.0f}s with {len(_feed_refcounts)} "
+                       f"active feeds — reconnecting.")
+        while _feed_refcounts and not _reconnect_breeze_feed(client):
+            _feed_supervisor_stats["reconnect_failures"] += 1
+            logger.warning(f"[feed] Retrying reconnect in {backoff:.0f}s.")
+            socketio.sleep(backoff)
+            backoff = min(backoff * 2, FEED_RECONNECT_MAX_BACKOFF_S)
+        _feed_supervisor_stats["reconnects"] += 1
+        backoff = 1.0
+        if tick_at_last_reconnect is not None:
+            quiet_factor = min(quiet_factor * 2, 8)
+        tick_at_last_reconnect = _last_tick_at
+        _fill_feed_gap(client, list(_feed_refcounts))
+
+
+class _UnixTickBus:
+    """
+    Feed-owner election and tick fan-out between gunicorn workers over one UNIX socket
+    (see TICK_BUS_PATH).  Frames are newline-delimited JSON objects with an "op":
+      peer -> owner: hello {feeds, depth[, session]}, acquire / release {code[, symbol]},
+                     acquire_depth / release_depth {code}, session {token}
+      owner -> peer: tick {payload}, depth {stock_code, depth}, session {token},
+                     resync {} (answered with a fresh hello)
+    """
+
+    def __init__(self, path: str, elect: bool = True):
+        self.path = path
+        self.elect = elect   # False: never stand for owner (FEED_PROCESS=1 web workers)
+        self.is_owner = False
+        self._lock_file = None
+        self._owner_conn = None
+        self._peers: dict[str, _LightQueue] = {}   # peer id -> outgoing frames
+        self._peer_ids = itertools.count(1)
+        self.stats = {"published": 0, "received": 0, "peer_drops": 0, "elections": 0}
+
+    def start(self) -> None:
+        socketio.start_background_task(self._run)
+
+    @staticmethod
+    def _frame(message: dict) -> bytes:
+        return json.dumps(message, default=str, separators=(",", ":")).encode() + b"\n"
+
+    def publish(self, message: dict) -> None:
+        """Owner: queue one frame for every peer; a peer that falls TICK_BUS_PEER_BACKLOG behind is dropped."""
+        if not self._peers:
+            return
+        frame = self._frame(message)
+        for peer, outbox in list(self._peers.items()):
+            try:
+                outbox.put_nowait(frame)
+            except _QueueFull:
+                logger.warning(f"[bus] {peer} fell {TICK_BUS_PEER_BACKLOG} frames behind — disconnecting it.")
+                self.stats["peer_drops"] += 1
+                self._peers.pop(peer, None)
+        self.stats["published"] += 1
+
+    def send(self, message: dict) -> None:
+        """Peer: send one frame to the owner.  Lost while disconnected; the next hello resyncs."""
+        conn = self._owner_conn
+        if conn is None:
+            return
+        try:
+            conn.sendall(self._frame(message))
+        except OSError as e:
+            logger.warning(f"[bus] Send to feed owner failed: {e}")
+
+    def relay_session(self, token: str) -> None:
+        """Share a newly activated Breeze session token with every other worker."""
+        if self.is_owner:
+            self.publish({"op": "session", "token": token})
+        else:
+            self.send({"op": "session", "token": token})
+
+    # -- election ---------------------------------------------------------------
+    def _run(self) -> None:
+        while True:
+            if self.elect and self._try_elect():
+                self._serve()   # returns only if the listener fails
+                self.is_owner = False
+            else:
+                self._follow()
+            socketio.sleep(1.0)
+
+    def _try_elect(self) -> bool:
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file   # held (and the lock with it) for the life of the process
+        return True
+
+    # -- owner ------------------------------------------------------------------
+    def _serve(self) -> None:
+        global _last_tick_at, _quote_board
+        self.is_owner = True
+        if QUOTE_BOARD_PATH and (_quote_board is None or not _quote_board.writable):
+            _quote_board = _QuoteBoard(QUOTE_BOARD_PATH, QUOTE_BOARD_SLOTS, writable=True)
+        self.stats["elections"] += 1
+        logger.info(f"[bus] Elected feed owner (pid {os.getpid()}) on {self.path}")
+        _start_tick_dispatcher()   # the owner dispatches (and publishes) even with no clients of its own
+        if _feed_refcounts:
+            # Promoted from peer: this worker's own clients still need their feeds.
+            client = breeze_client
+            if client is not None and client.session_key:
+                _last_tick_at = time.monotonic()
+                _reconnect_breeze_feed(client)
+        try:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            listener = eventlet.listen(self.path, family=socket.AF_UNIX)
+        except OSError as e:
+            logger.error(f"[bus] Cannot listen on {self.path}: {e}")
+            return
+        while True:
+            conn, _ = listener.accept()
+            peer = f"bus:{next(self._peer_ids)}"
+            outbox = _LightQueue(TICK_BUS_PEER_BACKLOG)
+            self._peers[peer] = outbox
+            socketio.start_background_task(self._write_peer, peer, conn, outbox)
+            socketio.start_background_task(self._read_peer, peer, conn)
+
+    def _write_peer(self, peer: str, conn, outbox) -> None:
+        try:
+            while True:
+                frame = outbox.get()
+                if frame is None:
+                    break
+                conn.sendall(frame)
+        except OSError:
+            pass
+        finally:
+            self._peers.pop(peer, None)
+            conn.close()
+
+    def _read_peer(self, peer: str, conn) -> None:
+        """Apply a peer's feed references to this worker's refcounts, holding them as `peer`."""
+        logger.info(f"[bus] Peer worker connected: {peer}")
+        try:
+            for line in conn.makefile("rb"):
+                message = json.loads(line)
+                op = message.get("op")
+                client = initialize_breeze()
+                if op == "hello":
+                    if message.get("session"):
+                        _adopt_session_token(message["session"])
+                    for code, symbol in message.get("feeds", []):
+                        _acquire_feed(client, peer, code, symbol)
+                    for code, symbol in message.get("depth", []):
+                        _acquire_depth_feed(client, peer, code, symbol)
+                elif op == "acquire":
+                    _acquire_feed(client, peer, message["code"], message.get("symbol") or message["code"])
+                elif op == "acquire_depth":
+                    _acquire_depth_feed(client, peer, message["code"], message.get("symbol") or message["code"])
+                elif op == "release":
+                    _release_sid_feeds(peer, [message["code"]])
+                elif op == "release_depth":
+                    _release_depth_feeds(peer, [message["code"]])
+                elif op == "session":
+                    _adopt_session_token(message["token"])
+                    self.publish(message)
+        except (OSError, ValueError) as e:
+            logger.warning(f"[bus] Peer {peer} connection error: {e}")
+        finally:
+            logger.info(f"[bus] Peer worker disconnected: {peer}")
+            outbox = self._peers.pop(peer, None)
+            if outbox is not None:
+                outbox.put(None)
+            _release_sid_feeds(peer)
+
+    # -- peer -------------------------------------------------------------------
+    def _follow(self) -> None:
+        try:
+            conn = eventlet.connect(self.path, family=socket.AF_UNIX)
+        except OSError:
+            return   # owner not listening yet (or just died); retry the election
+        self._owner_conn = conn
+        logger.info(f"[bus] Following feed owner on {self.path}")
+        self._send_hello()
+        try:
+            for line in conn.makefile("rb"):
+                message = json.loads(line)
+                op = message.get("op")
+                self.stats["received"] += 1
+                if op == "tick":
+                    tick = message["payload"]
+                    tick["_bus"] = True
+                    tick["_received_at"] = time.monotonic()
+                    _tick_dispatch_queue.put(tick)
+                elif op == "depth":
+                    _tick_dispatch_queue.put({"stock_code": message["stock_code"], "depth": message["depth"],
+                                              "_bus": True, "_received_at": time.monotonic()})
+                elif op == "session":
+                    _adopt_session_token(message["token"])
+                elif op == "resync":
+                    self._send_hello()
+        except (OSError, ValueError) as e:
+            logger.warning(f"[bus] Lost feed owner: {e}")
+        finally:
+            self._owner_conn = None
+            conn.close()
+
+    def _send_hello(self) -> None:
+        """Tell the owner every feed this worker holds (and its session, for a restarted owner)."""
+        self.send({
+            "op": "hello",
+            "feeds": [[code, _feed_symbols.get(code, code)] for code in _feed_refcounts],
+            "depth": [[code, _feed_symbols.get(code, code)] for code in _depth_refcounts],
+            "session": DAILY_SESSION_TOKEN,
+        })
+
+
+def _adopt_session_token(token: str) -> None:
+    """Activate a Breeze session token relayed from another worker."""
+    global DAILY_SESSION_TOKEN
+    if not token or token == DAILY_SESSION_TOKEN:
+        return
+    DAILY_SESSION_TOKEN = token
+    _session_validity_cache["checked_at"] = 0.0
+    client = initialize_breeze()
+    if client is None:
+        return
+    try:
+        client.generate_session(api_secret=get_secret("BREEZE_API_SECRET"), session_token=token)
+        logger.info("[bus] Breeze session activated from another worker.")
+    except Exception as e:
+        logger.error(f"[bus] Relayed session activation failed: {e}")
+        return
+    if _tick_bus is not None and _tick_bus.is_owner:
+        # Subscriptions attempted without a session were dropped: resubscribe ours, have peers
+        # re-send theirs, and load previous closes for normalization as set_session would.
+        if _feed_refcounts:
+            _reconnect_breeze_feed(client)
+        _tick_bus.publish({"op": "resync"})
+        socketio.start_background_task(_preload_prev_closes)
+
+
+_QUOTE_BOARD_MAGIC = b"BRZQBRD1"
+_QUOTE_BOARD_HEADER = struct.Struct("<8sI4x")   # magic, slot count
+_QUOTE_BOARD_FIELDS = (
+    "ltp", "previous_close", "change", "percent_change", "open", "high", "low", "volume",
+    "best_bid_price", "best_bid_quantity", "best_offer_price", "best_offer_quantity",
+    "updated_at", "live_since",   # monotonic clock (shared by every process on the host)
+)
+_QUOTE_SLOT_DTYPE = np.dtype([
+    ("seq", "<u8"),
+    ("symbol", "S24"),
+    ("values", "<f8", (len(_QUOTE_BOARD_FIELDS),)),
+])
 
 
-def _dispatch_tick(ticks: dict) -> None:
+class _QuoteBoard:
     """
-    Resolve the Breeze tick's stock_code to the frontend symbol and emit
-    a watchlist_update event to all subscribed Socket.IO SIDs.
-
-    Runs from the _run_tick_dispatcher greenlet — safe to call socketio.emit() here.
+    Latest normalized quote per symbol in a fixed-layout shared mmap (see QUOTE_BOARD_PATH):
+    a 16-byte header, then `slots` records of _QUOTE_SLOT_DTYPE.
+
+    A symbol owns the first matching-or-empty slot probing linearly from crc32(symbol); slots
+    are never freed.  The single writer bumps `seq` to odd, stores the values and bumps it back
+    to even; a reader copies the values between two identical even `seq` reads, so it never
+    sees a torn quote and never blocks the writer.  The file is reused (not replaced) across
+    feed-process restarts so read-only mappings in the web workers stay valid.
     """
-    raw = ticks.get("stock_code") or ticks.get("stock_name") or ticks.get("symbol") or ""
-    # Breeze sometimes sends stock_code in token format: "4.1!NIFTY" or "1!NIFTY"
-    token_match = re.match(r"^\d+\.?\d*!(.+)$", str(raw))
-    if token_match:
-        raw = token_match.group(1)
 
-    resolved = _registry_symbol_map.get(canonical_symbol(raw)) or canonical_symbol(raw)
-    payload = normalize_tick_for_frontend(ticks, resolved)
+    def __init__(self, path: str, slots: int = QUOTE_BOARD_SLOTS, writable: bool = False):
+        self.path = path
+        self.writable = writable
+        self.rows = None
+        self._index: dict[str, int] = {}   # symbol -> slot, filled on first successful probe
+        self.stats = {"writes": 0, "reads": 0, "retries": 0, "full": 0}
+        if writable:
+            header = _QUOTE_BOARD_HEADER.pack(_QUOTE_BOARD_MAGIC, slots)
+            size = _QUOTE_BOARD_HEADER.size + slots * _QUOTE_SLOT_DTYPE.itemsize
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                reuse = os.fstat(fd).st_size == size and os.pread(fd, len(header), 0) == header
+                if not reuse:
+                    os.ftruncate(fd, size)
+                self._map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            if not reuse:
+                self._map[:] = bytes(size)
+                self._map[:len(header)] = header
+            self._attach()
+
+    def _attach(self) -> bool:
+        """Map the board (readers retry until the feed process has created it)."""
+        if self.rows is not None:
+            return True
+        if not self.writable:
+            try:
+                with open(self.path, "rb") as f:
+                    magic, slots = _QUOTE_BOARD_HEADER.unpack(f.read(_QUOTE_BOARD_HEADER.size))
+                    if magic != _QUOTE_BOARD_MAGIC:
+                        return False
+                    self._map = mmap.mmap(f.fileno(), _QUOTE_BOARD_HEADER.size + slots * _QUOTE_SLOT_DTYPE.itemsize,
+                                          access=mmap.ACCESS_READ)
+            except (OSError, struct.error, ValueError):
+                return False
+        slots = _QUOTE_BOARD_HEADER.unpack_from(self._map)[1]
+        self.rows = np.ndarray(slots, _QUOTE_SLOT_DTYPE, buffer=self._map, offset=_QUOTE_BOARD_HEADER.size)
+        self._seq, self._symbols, self._values = self.rows["seq"], self.rows["symbol"], self.rows["values"]
+        return True
+
+    def _slot(self, symbol: str, claim: bool = False):
+        slot = self._index.get(symbol)
+        if slot is not None:
+            return slot
+        key = symbol.encode()[:_QUOTE_SLOT_DTYPE["symbol"].itemsize]
+        n = len(self.rows)
+        slot = zlib.crc32(key) % n
+        for _ in range(n):
+            current = self._symbols[slot]
+            if current == key:
+                self._index[symbol] = slot
+                return slot
+            if not current:
+                if not claim:
+                    return None
+                self._symbols[slot] = key
+                self._index[symbol] = slot
+                return slot
+            slot = (slot + 1) % n
+        return None
 
-    targets = list(_tick_registry.get(resolved, set()))
-    logger.debug(f"[dispatch] symbol={resolved!r} ltp={payload.get('ltp')} targets={targets}")
+    def write(self, symbol: str, payload: dict) -> None:
+        slot = self._slot(symbol, claim=True)
+        if slot is None:
+            self.stats["full"] += 1
+            return
+        values = [to_float(payload.get(field)) for field in _QUOTE_BOARD_FIELDS[:-2]]
+        values += (time.monotonic(), _feed_live_since.get(symbol, 0.0))
+        seq = int(self._seq[slot])
+        self._seq[slot] = seq + 1
+        self._values[slot] = values
+        self._seq[slot] = seq + 2
+        self.stats["writes"] += 1
+
+    def mark_not_live(self, symbol: str) -> None:
+        """The symbol's feed was released: its slot is fresh only by age from now on."""
+        slot = self._index.get(symbol)
+        if slot is not None:
+            seq = int(self._seq[slot])
+            self._seq[slot] = seq + 1
+            self._values[slot, -1] = 0.0
+            self._seq[slot] = seq + 2
+
+    def read(self, symbol: str):
+        """Consistent copy of the symbol's slot as {field: value}, or None if it was never written."""
+        if not self._attach():
+            return None
+        slot = self._slot(symbol)
+        if slot is None:
+            return None
+        for _ in range(1000):
+            before = self._seq[slot]
+            if before & 1:
+                self.stats["retries"] += 1
+                continue
+            values = self._values[slot].copy()
+            if self._seq[slot] == before:
+                break
+            self.stats["retries"] += 1
+        else:
+            return None
+        if not before:
+            return None
+        self.stats["reads"] += 1
+        return dict(zip(_QUOTE_BOARD_FIELDS, values.tolist()))
 
-    for sid in targets:
-        try:
-            socketio.emit('watchlist_update', payload, to=sid, namespace='/')
-        except Exception as e:
-            logger.error(f"Tick dispatch error {resolved} -> {sid}: {e}")
+    def fresh(self, symbol: str, max_age: float):
+        """Normalized quote from the board under the _fresh_quote rule, else None."""
+        quote = self.read(symbol)
+        if quote is None:
+            return None
+        updated_at, live_since = quote.pop("updated_at"), quote.pop("live_since")
+        if time.monotonic() - updated_at > max_age and not (live_since and updated_at >= live_since):
+            return None
+        quote.update({
+            "symbol": symbol,
+            "stock_code": symbol,
+            "last_traded_price": quote["ltp"],
+            "ltp_percent_change": quote["percent_change"],
+            "total_quantity_traded": quote["volume"],
+        })
+        return quote
 
 
-def _run_tick_dispatcher():
+def run_feed_process() -> None:
     """
-    Flask-SocketIO background task (eventlet greenlet) that drains _tick_dispatch_queue
-    and calls _dispatch_tick for each tick.
+    `python breeze_proxy_app.py feed`: the dedicated Breeze feed process for FEED_PROCESS=1.
 
-    Runs for the lifetime of the server. Uses socketio.sleep() to yield cooperatively
-    so other greenlets (HTTP handlers, Socket.IO heartbeats) can run between polls.
+    Serves no HTTP.  It is the only tick-bus owner — web workers request feeds and receive
+    normalized ticks over TICK_BUS_PATH — and the only writer of the quote board.
     """
-    logger.info("[dispatcher] Tick dispatcher started.")
+    global _tick_bus
+    if not TICK_BUS_PATH:
+        raise SystemExit("The feed process needs TICK_BUS_PATH (shared with the web workers).")
+    initialize_breeze()
+    _tick_bus = _UnixTickBus(TICK_BUS_PATH)
+    _tick_bus.start()
+    logger.info(f"[feed] Feed process {os.getpid()} started (bus {TICK_BUS_PATH}, "
+                f"quote board {QUOTE_BOARD_PATH or 'off'})")
     while True:
-        # Drain all pending ticks without blocking before yielding.
-        while True:
-            try:
-                ticks = _tick_dispatch_queue.get_nowait()
-                _dispatch_tick(ticks)
-            except _stdlib_queue.Empty:
-                break
-        socketio.sleep(0.005)  # 5 ms cooperative yield — low latency with cooperative multitasking
-
-
-def _register_tick_sid(symbol: str, sid: str) -> None:
-    _tick_registry.setdefault(symbol, set()).add(sid)
-
-
-def _unregister_sid(sid: str) -> None:
-    """Remove a disconnected SID from all registry entries."""
-    for sym_sids in _tick_registry.values():
-        sym_sids.discard(sid)
+        eventlet.sleep(60)
 
 
 def get_gemini_model_candidates():
@@ -507,6 +2608,235 @@ def get_breeze_symbol(standard_symbol):
     return standard_symbol
 
 
+def _prefetch_breeze_symbols(standard_symbols) -> None:
+    """Fill mapping_cache for many symbols with one Supabase query (see get_breeze_symbol)."""
+    missing = [s for s in standard_symbols if s not in BREEZE_SYMBOL_OVERRIDES and s not in mapping_cache]
+    if not missing:
+        return
+    if not supabase:
+        initialize_supabase()
+    if not supabase:
+        return
+    try:
+        response = supabase.table('nse_master_list').select('symbol, short_name').in_('symbol', missing).execute()
+        for row in response.data or []:
+            if row.get('short_name'):
+                mapping_cache[row['symbol']] = row['short_name']
+    except Exception as e:
+        logger.error(f"Bulk mapping error for {len(missing)} symbols: {e}")
+
+
+def _tracked_universe() -> set:
+    """NIFTY, every symbol in Supabase priority_stocks, and every symbol with live subscribers."""
+    universe = {"NIFTY"}
+    universe.update(sym for sym, sids in _tick_registry.items() if sids)
+    if not supabase:
+        initialize_supabase()
+    if supabase:
+        try:
+            rows = supabase.table('priority_stocks').select('symbol').execute().data or []
+            universe.update(canonical_symbol(r.get('symbol')) for r in rows if r.get('symbol'))
+        except Exception as e:
+            logger.warning(f"[prev_close] priority_stocks lookup failed: {e}")
+    return universe
+
+
+def _historical_rows(res) -> list:
+    """Candle rows from a get_historical_data response; raises on a Breeze error."""
+    if isinstance(res, list):
+        return res
+    if isinstance(res, dict):
+        if res.get("Success") is not None:
+            return res["Success"]
+        if res.get("Error"):
+            raise RuntimeError(f"Breeze historical error: {res['Error']}")
+        return []
+    raise RuntimeError(f"Unexpected historical response: {res!r}")
+
+
+def _historical_cache_path(stock_code: str, exchange_code: str, interval: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9_-]", "_", f"{exchange_code}_{stock_code}_{interval}")
+    return os.path.join(HISTORICAL_CACHE_DIR, f"{name}.npz")
+
+
+def _load_historical_cache(path: str):
+    """(days datetime64[D], ohlcv float64 (n, 5), ranges datetime64[D] (m, 2)); empty if absent."""
+    try:
+        with np.load(path) as npz:
+            return npz["days"], npz["ohlcv"], npz["ranges"]
+    except (OSError, KeyError, ValueError):
+        return (np.empty(0, "datetime64[D]"), np.empty((0, 5)), np.empty((0, 2), "datetime64[D]"))
+
+
+def _save_historical_cache(path: str, days, ohlcv, ranges) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, days=days, ohlcv=ohlcv, ranges=ranges)
+    os.replace(tmp, path)
+
+
+def _uncovered_ranges(ranges, start: int, end: int) -> list:
+    """Sub-ranges of the inclusive day-number range [start, end] not inside any of `ranges` (sorted, merged)."""
+    gaps, cursor = [], start
+    for lo, hi in ranges:
+        if hi < cursor:
+            continue
+        if lo > end:
+            break
+        if lo > cursor:
+            gaps.append((cursor, lo - 1))
+        cursor = max(cursor, hi + 1)
+        if cursor > end:
+            return gaps
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def _merge_ranges(ranges) -> np.ndarray:
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return np.array(merged, dtype=np.int64).reshape(-1, 2).astype("datetime64[D]")
+
+
+def _cached_historical(client, stock_code: str, exchange_code: str, from_date, to_date, interval: str = "1day"):
+    """
+    Candles for [from_date, to_date] through the on-disk cache, as (rows, source) with source
+    "cache" (no Breeze call), "partial" (gaps / today fetched) or "breeze" (nothing was held).
+    Returns None when the request is not cacheable; the caller then calls Breeze itself.
+    """
+    if not HISTORICAL_CACHE_DIR or interval not in HISTORICAL_CACHE_INTERVALS or not stock_code:
+        return None
+    try:
+        start = np.datetime64(str(from_date)[:10], "D")
+        end = np.datetime64(str(to_date or get_ist_now().date())[:10], "D")
+    except ValueError:
+        return None
+    if end < start:
+        return [], "cache"
+    today = np.datetime64(get_ist_now().date(), "D")
+    path = _historical_cache_path(stock_code, exchange_code, interval)
+    days, ohlcv, ranges = _load_historical_cache(path)
+
+    def fetch(lo: int, hi: int):
+        _historical_cache_stats["gap_fetches"] += 1
+        res = client.get_historical_data(stock_code=stock_code, exchange_code=exchange_code, product_type="cash",
+                                         from_date=str(np.datetime64(lo, "D")), to_date=str(np.datetime64(hi, "D")),
+                                         interval=interval)
+        fetched_days, fetched = [], []
+        for row in _historical_rows(res):
+            try:
+                day = np.datetime64(str(row.get("datetime") or row.get("Date") or "")[:10], "D")
+            except ValueError:
+                continue
+            fetched_days.append(day)
+            fetched.append([to_float(row.get(k), math.nan) for k in ("open", "high", "low", "close", "volume")])
+        return np.array(fetched_days, dtype="datetime64[D]"), np.array(fetched, dtype=np.float64).reshape(-1, 5)
+
+    first, last = int(start.astype(np.int64)), int(min(end, today - 1).astype(np.int64))
+    gaps = _uncovered_ranges(ranges.astype(np.int64).tolist(), first, last) if first <= last else []
+    if gaps:
+        for lo, hi in gaps:
+            new_days, new_ohlcv = fetch(lo, hi)
+            held = days.astype(np.int64)
+            keep = (held < lo) | (held > hi)
+            days = np.concatenate([days[keep], new_days])
+            ohlcv = np.concatenate([ohlcv[keep], new_ohlcv])
+            ranges = _merge_ranges(ranges.astype(np.int64).tolist() + [[lo, hi]])
+        order = np.argsort(days, kind="stable")
+        days, ohlcv = days[order], ohlcv[order]
+        try:
+            _save_historical_cache(path, days, ohlcv, ranges)
+        except OSError as e:
+            logger.warning(f"[historical] Cache write failed for {path}: {e}")
+
+    lo_i, hi_i = np.searchsorted(days, start, "left"), np.searchsorted(days, end, "right")
+    days, ohlcv = days[lo_i:hi_i], ohlcv[lo_i:hi_i]
+    if end >= today:   # today's (still forming) candle, never cached
+        live_days, live_ohlcv = fetch(int(max(start, today).astype(np.int64)), int(end.astype(np.int64)))
+        days, ohlcv = np.concatenate([days, live_days]), np.concatenate([ohlcv, live_ohlcv])
+
+    if not gaps and end < today:
+        source = "cache"
+    else:
+        source = "breeze" if gaps == [(first, last)] or first > last else "partial"
+    _historical_cache_stats[{"cache": "hits", "partial": "partial", "breeze": "misses"}[source]] += 1
+    # NaN marks a field Breeze left out of the row; it goes back out as null (JSON has no NaN).
+    rows = [
+        {"datetime": f"{day} 00:00:00", "stock_code": stock_code, "exchange_code": exchange_code,
+         "open": o, "high": h, "low": l, "close": c, "volume": v}
+        for day, (o, h, l, c, v) in zip(days.astype(str).tolist(), np.where(np.isnan(ohlcv), None, ohlcv).tolist())
+    ]
+    return rows, source
+
+
+def _preload_prev_closes() -> None:
+    """
+    Bulk-fill _symbol_prev_close for the whole tracked universe from Breeze daily candles,
+    so the very first WebSocket tick per symbol already gets the correct daily change/%
+    (see normalize_tick_for_frontend) without waiting for a per-symbol REST snapshot.
+
+    Runs on session activation.  Breeze has no multi-symbol historical call, so this is
+    one pooled pass in the background Breeze lane; the previous close is the last daily
+    candle dated before today (IST).
+    """
+    client = initialize_breeze()
+    if not client or not client.session_key:
+        return
+    started = time.monotonic()
+    today = get_ist_now().date()
+    from_date = str(today - datetime.timedelta(days=10))   # covers weekends + a holiday run
+    universe = sorted(_tracked_universe())
+    loaded = 0
+
+    def fetch(symbol):
+        nonlocal loaded
+        try:
+            with _breeze_lane("background"):
+                # Ends yesterday: only finished candles are needed, so a warm cache skips Breeze entirely.
+                cached = _cached_historical(client, get_breeze_symbol(symbol), "NSE", from_date,
+                                            str(today - datetime.timedelta(days=1)))
+                if cached is not None:
+                    rows = cached[0]
+                else:
+                    res = client.get_historical_data(
+                        stock_code=get_breeze_symbol(symbol),
+                        exchange_code="NSE",
+                        product_type="cash",
+                        from_date=from_date,
+                        to_date=str(today),
+                        interval="1day"
+                    )
+                    if isinstance(res, dict):
+                        rows = res.get("Success") or []
+                    else:
+                        rows = res if isinstance(res, list) else []
+            prior = [r for r in rows if str(r.get("datetime", ""))[:10] < str(today)]
+            if prior:
+                close = to_float(prior[-1].get("close"))
+                if close > 0:
+                    _symbol_prev_close[symbol] = close
+                    loaded += 1
+        except Exception as e:
+            logger.warning(f"[prev_close] Preload failed for {symbol}: {e}")
+
+    pool = eventlet.GreenPool(SNAPSHOT_CONCURRENCY)
+    for symbol in universe:
+        pool.spawn_n(fetch, symbol)
+    pool.waitall()
+
+    elapsed = time.monotonic() - started
+    _prev_close_preload.update({
+        "symbols": len(universe), "loaded": loaded, "seconds": round(elapsed, 2),
+        "finished_at": get_ist_now().isoformat(),
+    })
+    logger.info(f"[prev_close] Preloaded {loaded}/{len(universe)} previous closes in {elapsed:.1f}s.")
+
+
 # ─────────────────────────────────────────────
 # HEALTH ROUTES
 # ─────────────────────────────────────────────
@@ -566,6 +2896,137 @@ def health():
     })
 
 
+@app.route("/api/breeze/stream/stats", methods=["GET"])
+@cross_origin()
+def stream_stats():
+    """Tick dispatcher counters: conflation and queue backpressure (depth, high-water mark, drops)."""
+    return jsonify({
+        "conflation_ms": TICK_CONFLATION_MS,
+        **_tick_stream_stats,
+        "queue_depth": _tick_dispatch_queue.qsize(),
+        "queue_high_water": _tick_dispatch_queue.high_water,
+        "queue_maxsize": _tick_dispatch_queue.maxsize,
+        "queue_dropped": _tick_dispatch_queue.dropped,
+        "queue_overflow_episodes": _tick_dispatch_queue.overflow_episodes,
+        "prev_close_preload": _prev_close_preload,
+    })
+
+
+def _prom_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    body = ",".join(
+        f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for k, v in labels.items()
+    )
+    return "{" + body + "}"
+
+
+def _prom_metric(lines: list, name: str, mtype: str, help_text: str, samples) -> None:
+    """Append one metric family in Prometheus text format; samples are (name, labels, value)."""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {mtype}")
+    for sample_name, labels, value in samples:
+        lines.append(f"{sample_name}{_prom_labels(labels)} {value}")
+
+
+@app.route("/api/metrics", methods=["GET"])
+@cross_origin()
+def prometheus_metrics():
+    """Prometheus scrape endpoint: tick pipeline latency, per-symbol tick counts, subscribers, queue."""
+    lines: list = []
+    _prom_metric(lines, "breeze_tick_stage_latency_seconds", "histogram",
+                 "Tick latency per pipeline stage (queue, conflation, emit, end_to_end).",
+                 (sample for stage, hist in _tick_latency.items()
+                  for sample in hist.samples("breeze_tick_stage_latency_seconds", {"stage": stage})))
+    _prom_metric(lines, "breeze_ticks_total", "counter",
+                 "Ticks received from the Breeze WebSocket per symbol.",
+                 (("breeze_ticks_total", {"symbol": sym}, n) for sym, n in sorted(_symbol_tick_counts.items())))
+    _prom_metric(lines, "breeze_tick_subscribers", "gauge",
+                 "Socket.IO SIDs subscribed per symbol.",
+                 (("breeze_tick_subscribers", {"symbol": sym}, len(sids)) for sym, sids in sorted(_tick_registry.items())))
+    _prom_metric(lines, "breeze_tick_subscriber_sids", "gauge",
+                 "Distinct Socket.IO SIDs with at least one symbol subscription.",
+                 [("breeze_tick_subscriber_sids", {}, len(set().union(*_tick_registry.values())))])
+    for key, value in _tick_stream_stats.items():
+        _prom_metric(lines, f"breeze_dispatcher_{key}_total", "counter",
+                     f"Dispatcher {key.replace('_', ' ')}.", [(f"breeze_dispatcher_{key}_total", {}, value)])
+    _prom_metric(lines, "breeze_watchlist_bootstrap_seconds", "histogram",
+                 "Time from subscribe_to_watchlist to the last initial quote emitted.",
+                 _bootstrap_latency.samples("breeze_watchlist_bootstrap_seconds", {}))
+    _prom_metric(lines, "breeze_watchlist_bootstrap_quotes_total", "counter",
+                 "Initial watchlist quotes by source (store, rest) and REST failures.",
+                 [("breeze_watchlist_bootstrap_quotes_total", {"source": "store"}, _bootstrap_stats["quotes_from_store"]),
+                  ("breeze_watchlist_bootstrap_quotes_total", {"source": "rest"}, _bootstrap_stats["quotes_from_rest"]),
+                  ("breeze_watchlist_bootstrap_quotes_total", {"source": "rest_failed"}, _bootstrap_stats["rest_failures"])])
+    _prom_metric(lines, "breeze_quote_requests_total", "counter",
+                 "/api/breeze/quotes answers by source (store, cache, coalesced, breeze).",
+                 [("breeze_quote_requests_total", {"source": source}, _quote_cache_stats[key])
+                  for source, key in (("store", "store_hits"), ("cache", "hits"),
+                                      ("coalesced", "coalesced"), ("breeze", "misses"))])
+    scheduler = _breeze_scheduler
+    _prom_metric(lines, "breeze_rest_queue_seconds", "histogram",
+                 "Time Breeze REST calls waited for the global rate budget, by priority lane.",
+                 [sample for lane in scheduler.lanes
+                  for sample in scheduler.queue_time[lane].samples("breeze_rest_queue_seconds", {"lane": lane})])
+    _prom_metric(lines, "breeze_rest_queue_depth", "gauge", "Breeze REST calls waiting for a token, by lane.",
+                 [("breeze_rest_queue_depth", {"lane": lane}, len(q)) for lane, q in zip(scheduler.lanes, scheduler.waiting)])
+    _prom_metric(lines, "breeze_rest_calls_total", "counter", "Breeze REST calls admitted, by lane.",
+                 [("breeze_rest_calls_total", {"lane": lane}, n) for lane, n in scheduler.calls.items()])
+    for key, value in _quote_batch_stats.items():
+        _prom_metric(lines, f"breeze_quote_batch_{key}_total", "counter",
+                     f"/api/breeze/quotes/batch {key}.", [(f"breeze_quote_batch_{key}_total", {}, value)])
+    _prom_metric(lines, "breeze_feed_active_codes", "gauge", "Breeze feed codes with at least one subscriber.",
+                 [("breeze_feed_active_codes", {}, len(_feed_refcounts))])
+    _prom_metric(lines, "breeze_feed_seconds_since_last_tick", "gauge",
+                 "Seconds since the last Breeze WebSocket tick (-1 before the first tick).",
+                 [("breeze_feed_seconds_since_last_tick", {},
+                   round(time.monotonic() - _last_tick_at, 3) if _last_tick_at else -1)])
+    for key, value in _feed_supervisor_stats.items():
+        _prom_metric(lines, f"breeze_feed_{key}_total", "counter",
+                     f"Feed supervisor {key.replace('_', ' ')}.", [(f"breeze_feed_{key}_total", {}, value)])
+    _prom_metric(lines, "breeze_depth_active_codes", "gauge", "Breeze market-depth feeds with at least one subscriber.",
+                 [("breeze_depth_active_codes", {}, len(_depth_refcounts))])
+    for key, value in _depth_stats.items():
+        _prom_metric(lines, f"breeze_depth_{key}_total", "counter",
+                     f"Market depth {key.replace('_', ' ')}.", [(f"breeze_depth_{key}_total", {}, value)])
+    _prom_metric(lines, "breeze_alert_rules", "gauge", "Active price alert rules.",
+                 [("breeze_alert_rules", {}, len(_alert_symbols))])
+    for key, value in _alert_stats.items():
+        _prom_metric(lines, f"breeze_alert_{key}_total", "counter",
+                     f"Price alert {key}.", [(f"breeze_alert_{key}_total", {}, value)])
+    _prom_metric(lines, "breeze_tick_history_bytes", "gauge", "Memory held by the intraday tick history.",
+                 [("breeze_tick_history_bytes", {}, _tick_history_bytes)])
+    for key, value in _tick_history_stats.items():
+        _prom_metric(lines, f"breeze_tick_history_{key}_total", "counter",
+                     f"Tick history {key}.", [(f"breeze_tick_history_{key}_total", {}, value)])
+    _prom_metric(lines, "breeze_tick_queue_depth", "gauge", "Ticks waiting in the dispatch queue.",
+                 [("breeze_tick_queue_depth", {}, _tick_dispatch_queue.qsize())])
+    _prom_metric(lines, "breeze_tick_queue_high_water", "gauge", "Deepest dispatch queue backlog since start.",
+                 [("breeze_tick_queue_high_water", {}, _tick_dispatch_queue.high_water)])
+    _prom_metric(lines, "breeze_tick_queue_dropped_total", "counter",
+                 "Ticks superseded while the dispatch queue was full.",
+                 [("breeze_tick_queue_dropped_total", {}, _tick_dispatch_queue.dropped)])
+    _prom_metric(lines, "breeze_tick_queue_overflow_episodes_total", "counter",
+                 "Times the dispatch queue filled up (dispatcher starvation).",
+                 [("breeze_tick_queue_overflow_episodes_total", {}, _tick_dispatch_queue.overflow_episodes)])
+    for key, value in _historical_cache_stats.items():
+        _prom_metric(lines, f"breeze_historical_cache_{key}_total", "counter",
+                     f"Historical candle cache {key.replace('_', ' ')}.",
+                     [(f"breeze_historical_cache_{key}_total", {}, value)])
+    if _tick_bus is not None:
+        _prom_metric(lines, "breeze_tick_bus_owner", "gauge", "1 if this process holds the Breeze feed for the tick bus.",
+                     [("breeze_tick_bus_owner", {}, int(_tick_bus.is_owner))])
+        for key, value in _tick_bus.stats.items():
+            _prom_metric(lines, f"breeze_tick_bus_{key}_total", "counter",
+                         f"Tick bus frames/events: {key.replace('_', ' ')}.", [(f"breeze_tick_bus_{key}_total", {}, value)])
+    if _quote_board is not None:
+        for key, value in _quote_board.stats.items():
+            _prom_metric(lines, f"breeze_quote_board_{key}_total", "counter",
+                         f"Quote board {key}.", [(f"breeze_quote_board_{key}_total", {}, value)])
+    return "\n".join(lines) + "\n", 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
 # ─────────────────────────────────────────────
 # ADMIN: SET SESSION
 # ─────────────────────────────────────────────
@@ -599,6 +3060,10 @@ def set_session():
         DAILY_SESSION_TOKEN = api_session
         # Invalidate the health-check cache so the next poll reflects the new session
         _session_validity_cache["checked_at"] = 0.0
+        if _tick_bus is not None:
+            _tick_bus.relay_session(api_session)
+        # New trading session: refresh previous closes for the tracked universe in the background.
+        socketio.start_background_task(_preload_prev_closes)
         return jsonify({"status": "success", "message": "Daily session activated"}), 200
     except Exception as e:
         logger.error(f"Session Error: {e}")
@@ -617,29 +3082,199 @@ def get_quotes():
         return err_resp, status_code
 
     data = request.get_json() or {}
+    exchange_code = data.get("exchange_code", "NSE")
+    code = canonical_symbol(data.get("stock_code"))
+    symbol = _registry_symbol_map.get(code) or code
+    if exchange_code == "NSE" and symbol:
+        cached = _fresh_quote(symbol, to_float(data.get("max_age"), QUOTE_STORE_MAX_AGE_S))
+        if cached is not None:
+            _quote_cache_stats["store_hits"] += 1
+            return jsonify(wrap_success_payload(cached)), 200, {"X-Quote-Source": "store"}
     try:
-        res = client.get_quotes(
-            stock_code=data.get("stock_code"),
-            exchange_code=data.get("exchange_code", "NSE"),
-            product_type="cash"
-        )
-        normalized = normalize_breeze_response(res)
+        normalized, source = _cached_get_quotes(client, data.get("stock_code"), exchange_code)
         if normalized:
-            return jsonify(wrap_success_payload(normalized)), 200
-        return jsonify({"error": "Empty response from Breeze", "raw": str(res)}), 500
+            row = normalized[0] if isinstance(normalized, list) else normalized
+            if source == "breeze" and exchange_code == "NSE" and symbol and isinstance(row, dict):
+                _store_quote(symbol, normalize_tick_for_frontend(dict(row), symbol))
+            return jsonify(wrap_success_payload(normalized)), 200, {"X-Quote-Source": source}
+        return jsonify({"error": "Empty response from Breeze", "raw": str(normalized)}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/breeze/quotes/batch", methods=["POST"])
+@cross_origin()
+def get_quotes_batch():
+    """
+    Quotes for many symbols in one request.
+    Body: { "symbols": [...], "exchange_code": "NSE", "max_age": <seconds> }.
+    Fresh quotes come from the latest-quote store; the rest are fetched concurrently
+    (SNAPSHOT_CONCURRENCY at a time, in the snapshot Breeze lane).
+    Returns { "Success": { SYMBOL: quote }, "errors": { SYMBOL: message } }.
+    """
+    data = request.get_json() or {}
+    raw = data.get("symbols") or []
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    symbols = list(dict.fromkeys(canonical_symbol(s) for s in raw if str(s).strip()))
+    if not symbols:
+        return jsonify({"error": "symbols is required"}), 400
+    if len(symbols) > QUOTE_BATCH_MAX_SYMBOLS:
+        return jsonify({"error": f"At most {QUOTE_BATCH_MAX_SYMBOLS} symbols per batch"}), 400
+    exchange_code = data.get("exchange_code", "NSE")
+    max_age = to_float(data.get("max_age"), QUOTE_STORE_MAX_AGE_S)
+
+    quotes, errors, needed = {}, {}, []
+    for std in symbols:
+        symbol = _registry_symbol_map.get(std) or std
+        cached = _fresh_quote(symbol, max_age) if exchange_code == "NSE" else None
+        if cached is not None:
+            _quote_cache_stats["store_hits"] += 1
+            quotes[std] = cached
+        else:
+            needed.append(std)
+    if needed:
+        client, err_resp, status_code = ensure_breeze_session()
+        if err_resp:
+            for std in needed:
+                errors[std] = "Breeze session unavailable"
+            return jsonify({"Success": quotes, "errors": errors}), 200
+        _prefetch_breeze_symbols(needed)
+
+        def fetch(std):
+            symbol = _registry_symbol_map.get(std) or std
+            try:
+                with _breeze_lane("snapshot"):
+                    normalized, source = _cached_get_quotes(client, get_breeze_symbol(std), exchange_code)
+                rows = normalized if isinstance(normalized, list) else [normalized]
+                row = next((r for r in rows if isinstance(r, dict)), None)
+                if row is None or (row.get("Error") and not row.get("Success")):
+                    errors[std] = str(row.get("Error")) if row else "Empty response from Breeze"
+                    return
+                payload = normalize_tick_for_frontend(dict(row), symbol)
+                if source == "breeze" and exchange_code == "NSE":
+                    _store_quote(symbol, payload)
+                quotes[std] = payload
+            except Exception as e:
+                errors[std] = str(e)
+
+        pool = eventlet.GreenPool(SNAPSHOT_CONCURRENCY)
+        for std in needed:
+            pool.spawn_n(fetch, std)
+        pool.waitall()
+    _quote_batch_stats["requests"] += 1
+    _quote_batch_stats["symbols"] += len(symbols)
+    _quote_batch_stats["errors"] += len(errors)
+    return jsonify({"Success": quotes, "errors": errors}), 200
+
+
+@app.route("/api/breeze/quotes/latest", methods=["GET"])
+@cross_origin()
+def get_latest_quotes():
+    """
+    Read the in-memory latest-quote store (no Breeze call).
+    Query: symbols=A,B,C (default: all), max_age=<seconds> (default QUOTE_STORE_MAX_AGE_S).
+    Returns { "Success": { SYMBOL: quote }, "stale": [...], "missing": [...] }.
+    """
+    max_age = to_float(request.args.get("max_age"), QUOTE_STORE_MAX_AGE_S)
+    raw = request.args.get("symbols", "")
+    symbols = [canonical_symbol(s) for s in raw.split(",") if s.strip()] or sorted(_latest_quotes)
+    quotes, stale, missing = {}, [], []
+    for symbol in symbols:
+        symbol = _registry_symbol_map.get(symbol) or symbol
+        fresh = _fresh_quote(symbol, max_age)
+        if fresh is not None:
+            quotes[symbol] = fresh
+        elif symbol in _latest_quotes:
+            stale.append(symbol)
+        else:
+            missing.append(symbol)
+    return jsonify({"Success": quotes, "stale": stale, "missing": missing}), 200
+
+
+@app.route("/api/breeze/intraday", methods=["GET"])
+@cross_origin()
+def get_intraday_bars():
+    """
+    Today's 1-minute OHLCV bars built from the live tick stream (no Breeze call).
+    Query: symbol=SYM, optional from / to as "HH:MM" IST.
+    Returns { "Success": [bars], "complete": <tracked since the open> }.
+    """
+    symbol = canonical_symbol(request.args.get("symbol", ""))
+    if not symbol:
+        return jsonify({"error": "symbol is required"}), 400
+    symbol = _registry_symbol_map.get(symbol) or symbol
+    bounds = []
+    for name in ("from", "to"):
+        value = request.args.get(name)
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            hh, mm = (int(part) for part in value.split(":")[:2])
+            bounds.append(get_ist_now().replace(hour=hh, minute=mm, second=0, microsecond=0).timestamp())
+        except ValueError:
+            return jsonify({"error": f"{name} must be HH:MM"}), 400
+    return jsonify({"Success": _intraday_rows(symbol, *bounds),
+                    "complete": _intraday_covers_session(symbol)}), 200
+
+
+@app.route("/api/breeze/ticks", methods=["GET"])
+@cross_origin()
+def get_tick_history():
+    """
+    Today's recorded ticks for one symbol (no Breeze call).
+    Query: symbol=SYM, optional from / to as "HH:MM" or "HH:MM:SS" IST, limit (default 5000,
+    most recent ticks of the range).  Columnar response:
+    { "symbol", "times": [epoch ms], "ltp": [...], "volume": [per-tick volume], "truncated" }.
+    """
+    symbol = canonical_symbol(request.args.get("symbol", ""))
+    if not symbol:
+        return jsonify({"error": "symbol is required"}), 400
+    symbol = _registry_symbol_map.get(symbol) or symbol
+    bounds = []
+    for name in ("from", "to"):
+        value = request.args.get(name)
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            parts = [int(part) for part in value.split(":")]
+            hh, mm, ss = (parts + [0, 0])[:3]
+            bounds.append(int(get_ist_now().replace(hour=hh, minute=mm, second=ss, microsecond=0).timestamp() * 1000))
+        except ValueError:
+            return jsonify({"error": f"{name} must be HH:MM[:SS]"}), 400
+    limit = max(1, int(to_float(request.args.get("limit"), 5000)))
+    history = _tick_history.get(symbol)
+    if history is None:
+        return jsonify({"symbol": symbol, "times": [], "ltp": [], "volume": [], "truncated": False}), 200
+    times, prices, volumes = history.query(bounds[0], bounds[1], limit + 1)
+    truncated = len(times) > limit
+    if truncated:
+        times, prices, volumes = times[1:], prices[1:], volumes[1:]
+    return jsonify({"symbol": symbol, "times": times.tolist(), "ltp": prices.tolist(),
+                    "volume": volumes.tolist(), "truncated": truncated}), 200
+
+
 @app.route("/api/breeze/depth", methods=["POST"])
 @cross_origin()
 def get_depth():
-    """Fetch L2 Market Depth."""
+    """
+    Fetch L2 Market Depth.  Served from the streaming depth book when a depth
+    subscriber keeps it fresh (X-Depth-Source: book), otherwise via get_market_depth2.
+    """
+    data = request.get_json() or {}
+    if data.get("exchange_code", "NSE") == "NSE" and data.get("stock_code"):
+        book = _fresh_depth(_resolve_tick_symbol({"stock_code": data.get("stock_code")}))
+        if book is not None:
+            _depth_stats["rest_served_from_book"] += 1
+            return jsonify(wrap_success_payload([book.snapshot()])), 200, {"X-Depth-Source": "book"}
+
     client, err_resp, status_code = ensure_breeze_session()
     if err_resp:
         return err_resp, status_code
 
-    data = request.get_json() or {}
+    _depth_stats["rest_fallbacks"] += 1
     try:
         res = client.get_market_depth2(
             stock_code=data.get("stock_code"),
@@ -648,7 +3283,7 @@ def get_depth():
         )
         normalized = normalize_breeze_response(res)
         if normalized:
-            return jsonify(wrap_success_payload(normalized)), 200
+            return jsonify(wrap_success_payload(normalized)), 200, {"X-Depth-Source": "breeze"}
         return jsonify({"error": "Empty response from Breeze", "raw": str(res)}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -657,13 +3292,29 @@ def get_depth():
 @app.route("/api/breeze/historical", methods=["POST"])
 @cross_origin()
 def get_historical():
-    """Fetch historical OHLC data."""
+    """
+    Fetch historical OHLC data.  Same-day 1minute requests for a symbol tracked since the
+    open are answered from the live 1-minute bars (X-Historical-Source: intraday); daily
+    candles go through the on-disk cache (X-Historical-Source: cache | partial | breeze).
+    """
+    data = request.get_json() or {}
+    today = str(get_ist_now().date())
+    if (data.get("interval") == "1minute" and data.get("exchange_code", "NSE") == "NSE"
+            and str(data.get("from_date") or "")[:10] == today and str(data.get("to_date") or today)[:10] == today):
+        symbol = _resolve_tick_symbol({"stock_code": data.get("stock_code")})
+        if _intraday_covers_session(symbol):
+            return jsonify({"Success": _intraday_rows(symbol)}), 200, {"X-Historical-Source": "intraday"}
+
     client, err_resp, status_code = ensure_breeze_session()
     if err_resp:
         return err_resp, status_code
 
-    data = request.get_json() or {}
     try:
+        cached = _cached_historical(client, data.get("stock_code"), data.get("exchange_code", "NSE"),
+                                    data.get("from_date"), data.get("to_date"), data.get("interval", "1day"))
+        if cached is not None:
+            rows, source = cached
+            return jsonify({"Success": rows}), 200, {"X-Historical-Source": source}
         res = client.get_historical_data(
             stock_code=data.get("stock_code"),
             exchange_code=data.get("exchange_code", "NSE"),
@@ -1056,24 +3707,31 @@ def analyze_stock():
         if client:
             to_date = req_date
             from_date = to_date - timedelta(days=180)
-            res = client.get_historical_data(
-                stock_code=symbol,
-                exchange_code="NSE",
-                product_type="cash",
-                from_date=str(from_date),
-                to_date=str(to_date),
-                interval="1day"
-            )
-
-            rows = []
-            if isinstance(res, dict) and "Success" in res:
-                rows = res.get("Success") or []
-            elif isinstance(res, list):
-                rows = res
+            # Today's candle is built from live bars below; a cached range ending today would
+            # re-fetch today from Breeze on every call, so it stops at yesterday instead.
+            cache_to = to_date - timedelta(days=1) if req_date == get_ist_now().date() else to_date
+            cached = _cached_historical(client, symbol, "NSE", str(from_date), str(cache_to))
+            if cached is not None:
+                rows = cached[0]
             else:
-                normalized = normalize_breeze_response(res)
-                if normalized:
-                    rows = normalized
+                res = client.get_historical_data(
+                    stock_code=symbol,
+                    exchange_code="NSE",
+                    product_type="cash",
+                    from_date=str(from_date),
+                    to_date=str(to_date),
+                    interval="1day"
+                )
+
+                rows = []
+                if isinstance(res, dict) and "Success" in res:
+                    rows = res.get("Success") or []
+                elif isinstance(res, list):
+                    rows = res
+                else:
+                    normalized = normalize_breeze_response(res)
+                    if normalized:
+                        rows = normalized
 
             for r in (rows or []):
                 o = _safe_float(_get(r, "open", "Open", "OPEN"))
@@ -1084,6 +3742,20 @@ def analyze_stock():
                 if None not in (o, h, l, c):
                     candles.append({"open": o, "high": h, "low": l, "close": c, "volume": v})
 
+            # Breeze publishes today's daily candle only after the close; build it from live bars,
+            # but only when they cover the whole session (a symbol first tracked mid-day would
+            # give the candle a late open and a fraction of the volume).
+            if req_date == get_ist_now().date() and not any(
+                    str(_get(r, "datetime", "Date") or "")[:10] == date for r in rows[-1:]):
+                bar_symbol = _resolve_tick_symbol({"stock_code": symbol})
+                bars = _intraday_rows(bar_symbol) if _intraday_covers_session(bar_symbol) else []
+                if bars:
+                    candles.append({
+                        "open": bars[0]["open"], "high": max(b["high"] for b in bars),
+                        "low": min(b["low"] for b in bars), "close": bars[-1]["close"],
+                        "volume": sum(b["volume"] for b in bars),
+                    })
+
         if len(candles) >= 60:
             closes = [x["close"] for x in candles]
             highs = [x["high"] for x in candles]
@@ -1569,15 +4241,22 @@ def reg30_narrative():
 # ─────────────────────────────────────────────
 # SOCKET.IO HANDLERS
 # ─────────────────────────────────────────────
-@socketio.on('connect')
-def handle_connect():
+def _start_tick_dispatcher() -> None:
+    """Start the dispatcher, feed supervisor and intraday flusher greenlets (once per process)."""
     global _tick_dispatcher_started
-    logger.info(f"Client connected: {request.sid}")
-    # Start the tick dispatcher greenlet on the very first client connection.
     # socketio.start_background_task spawns an eventlet greenlet where socketio.emit() works correctly.
     if not _tick_dispatcher_started:
         _tick_dispatcher_started = True
         socketio.start_background_task(_run_tick_dispatcher)
+        socketio.start_background_task(_run_feed_supervisor)
+        socketio.start_background_task(_run_intraday_flusher)
+
+
+@socketio.on('connect')
+def handle_connect():
+    logger.info(f"Client connected: {request.sid}")
+    # Start the tick dispatcher greenlet on the very first client connection.
+    _start_tick_dispatcher()
 
 
 @socketio.on('disconnect')
@@ -1585,6 +4264,8 @@ def handle_disconnect():
     sid = request.sid
     logger.info(f"Client disconnected: {sid}")
     _unregister_sid(sid)
+    _release_sid_feeds(sid)
+    _remove_sid_alerts(sid)
 
 
 @socketio.on('subscribe_to_watchlist')
@@ -1592,11 +4273,141 @@ def handle_watchlist_subscription(data):
     sid = request.sid
     stock_list = data.get('stocks', [])
     proxy_key = data.get('proxy_key', '')
-    logger.info(f"Client {sid} subscribed to watchlist: {stock_list}")
-    socketio.start_background_task(track_watchlist, stock_list, proxy_key, sid)
+    # protocol="delta" opts into watchlist_snapshot / watchlist_delta instead of watchlist_update.
+    protocol = 'delta' if data.get('protocol') == 'delta' else 'full'
+    # batch=True collects a SID's updates per dispatcher cycle into one watchlist_batch event.
+    batch = bool(data.get('batch'))
+    # depth=True also streams the 5-level order book as market_depth events.
+    depth = bool(data.get('depth'))
+    # max_rate / symbol_rates (updates per second) cap full-protocol watchlist_update events.
+    rates = _parse_update_rates(data)
+    if protocol == 'delta' and (rates[0] or any(rates[1].values())):
+        # A skipped delta would leave a gap in the client's seq; delta clients get every change.
+        logger.warning(f"Client {sid}: max_rate/symbol_rates are not supported with protocol=delta; ignored.")
+        rates = (0, {})
+    _sid_options[sid] = (protocol, batch, depth, rates)
+    logger.info(f"Client {sid} subscribed to watchlist ({protocol}{', batch' if batch else ''}"
+                f"{', depth' if depth else ''}{', rate-limited' if any(rates) else ''}): {stock_list}")
+    socketio.start_background_task(track_watchlist, stock_list, proxy_key, sid, protocol, batch, depth, rates)
+
+
+def _parse_update_rates(data: dict) -> tuple:
+    """
+    (default interval_ms, {symbol: interval_ms}) from a subscribe payload's max_rate and
+    symbol_rates (updates per second; missing or <= 0 means every tick).
+    """
+    def interval(rate):
+        rate = to_float(rate)
+        return int(round(1000.0 / rate)) if rate > 0 else 0
+    per_symbol = {canonical_symbol(sym): interval(rate) for sym, rate in (data.get('symbol_rates') or {}).items()}
+    return interval(data.get('max_rate')), per_symbol
+
+
+@socketio.on('watchlist_add')
+def handle_watchlist_add(data):
+    """
+    Add symbols to this SID's watchlist without resending the whole list.  Only symbols
+    the SID is not already registered for are subscribed and snapshotted, using the
+    protocol/batch/depth/rate options of its subscribe_to_watchlist.
+    """
+    sid = request.sid
+    current = _sid_symbols.get(sid, set())
+    added = []
+    for symbol in (data or {}).get('stocks', []):
+        std = canonical_symbol(symbol)
+        if std and std not in current and std not in added:
+            added.append(std)
+    if not added:
+        return
+    protocol, batch, depth, rates = _sid_options.get(sid, ('full', False, False, (0, {})))
+    logger.info(f"Client {sid} added to watchlist: {added}")
+    socketio.start_background_task(track_watchlist, added, (data or {}).get('proxy_key', ''), sid,
+                                   protocol, batch, depth, rates)
+
+
+@socketio.on('watchlist_remove')
+def handle_watchlist_remove(data):
+    """
+    Remove symbols from this SID's watchlist: leave their rooms and drop the SID's feed
+    references, unsubscribing Breeze codes no other SID still holds.
+    """
+    sid = request.sid
+    current = _sid_symbols.get(sid, set())
+    removed = {canonical_symbol(symbol) for symbol in (data or {}).get('stocks', [])} & current
+    if not removed:
+        return
+    for symbol in removed:
+        _unregister_tick_sid(symbol, sid)
+        current.discard(symbol)
+    _release_sid_feeds(sid, [get_breeze_symbol(symbol) for symbol in removed])
+    logger.info(f"Client {sid} removed from watchlist: {sorted(removed)}")
+
+
+@socketio.on('alert_add')
+def handle_alert_add(data):
+    """
+    Add a price alert rule: {symbol, kind, threshold, repeat}.  Rules are evaluated on the
+    live tick stream, so the symbol should also be in this client's watchlist.  The ack
+    is {"id": rule_id} or {"error": ...}.
+    """
+    sid = request.sid
+    data = data or {}
+    symbol = canonical_symbol(data.get('symbol'))
+    kind = data.get('kind')
+    if not symbol or kind not in ALERT_KINDS:
+        return {"error": f"symbol and kind ({', '.join(ALERT_KINDS)}) are required"}
+    if kind in ("cross_prev_close", "cross_day_high"):
+        threshold = 0.0
+    else:
+        threshold = to_float(data.get('threshold'), 3.0 if kind == "volume_spike" else math.nan)
+        if math.isnan(threshold) or threshold <= 0:
+            return {"error": "threshold must be a positive number"}
+    if len(_sid_alerts.get(sid, ())) >= ALERT_MAX_RULES_PER_SID:
+        return {"error": f"at most {ALERT_MAX_RULES_PER_SID} alert rules per connection"}
+    rule_id = _add_alert(sid, symbol, kind, threshold, bool(data.get('repeat')))
+    logger.info(f"Client {sid} added alert {rule_id}: {symbol} {kind} {threshold}")
+    return {"id": rule_id}
+
+
+@socketio.on('alert_remove')
+def handle_alert_remove(data):
+    """Remove one of this client's alert rules by id; the ack is {"removed": bool}."""
+    sid = request.sid
+    rule_id = int(to_float((data or {}).get('id'), 0))
+    owned = _sid_alerts.get(sid, set())
+    if rule_id not in owned:
+        return {"removed": False}
+    owned.discard(rule_id)
+    return {"removed": _remove_alert(rule_id)}
+
+
+@socketio.on('watchlist_resync')
+def handle_watchlist_resync(data):
+    """
+    Delta-protocol clients emit this after a sequence gap.  Re-sends a watchlist_snapshot
+    for the requested symbols (default: every symbol this SID is subscribed to).
+    """
+    sid = request.sid
+    symbols = (data or {}).get('symbols') or list(_sid_symbols.get(sid, ()))
+    for symbol in symbols:
+        snapshot = _delta_snapshot(canonical_symbol(symbol))
+        if snapshot:
+            socketio.emit('watchlist_snapshot', snapshot, to=sid, namespace='/')
+
+
+def _emit_initial_quote(sid: str, symbol: str, payload: dict, protocol: str, batch: bool) -> None:
+    """Send one bootstrap quote to a single SID in the event shape it subscribed with."""
+    if protocol == "delta":
+        if symbol not in _delta_state:
+            _publish_delta(symbol, payload, skip_sid=sid)   # store entry came from a path that skips delta state
+        socketio.emit('watchlist_snapshot', _delta_snapshot(symbol), to=sid, namespace='/')
+    elif batch:
+        socketio.emit('watchlist_batch', [payload], to=sid, namespace='/')
+    else:
+        socketio.emit('watchlist_update', payload, to=sid, namespace='/')
 
 
-def track_watchlist(stock_list, proxy_key, sid):
+def track_watchlist(stock_list, proxy_key, sid, protocol="full", batch=False, depth=False, rates=(0, {})):
     """
     Uses Breeze WebSocket feeds for real-time watchlist updates.
 
@@ -1604,11 +4415,12 @@ def track_watchlist(stock_list, proxy_key, sid):
     Nifty card socket and the Watchlist socket in the browser) each receive the ticks
     they subscribed to, without one overwriting the other's on_ticks callback.
 
-    When the SID disconnects, its registry entries are cleaned up and any Breeze feeds
-    that have no remaining subscribers are unsubscribed.
+    Feeds are reference-counted per Breeze code (_acquire_feed), so only codes nobody
+    else watches are subscribed.  The task returns once the initial snapshot is sent;
+    handle_disconnect releases the SID's registry entries and feed references.  Also
+    used by watchlist_add with just the symbols being added.  `rates` is (default interval_ms,
+    {symbol: interval_ms}) from _parse_update_rates.
     """
-    global _subscribed_breeze_codes
-
     client, err_resp, _ = ensure_breeze_session()
     if err_resp:
         logger.error(f"Could not get Breeze session for watchlist (sid={sid}).")
@@ -1629,119 +4441,107 @@ def track_watchlist(stock_list, proxy_key, sid):
 
     # Register this SID for each symbol so _global_on_ticks dispatches to it.
     for symbol in stock_list:
-        _register_tick_sid(canonical_symbol(symbol), sid)
-
-    # Assign the global dispatcher once (idempotent — any subsequent assignment is the same function).
-    client.on_ticks = _global_on_ticks
-
-    # Connect Breeze WebSocket.
-    # Clear _subscribed_breeze_codes first: a reconnecting WebSocket has no existing
-    # subscriptions, so we must not skip re-subscribing based on stale data.
-    _subscribed_breeze_codes.clear()
-    try:
-        client.ws_connect()
-        logger.info(f"Breeze WebSocket connected for {sid}")
-    except Exception as e:
-        # ws_connect raises if already connected; safe to continue — feeds will be added below.
-        logger.warning(f"ws_connect for {sid}: {e}")
+        std = canonical_symbol(symbol)
+        _register_tick_sid(std, sid, protocol, batch, depth, rates[1].get(std, rates[0]))
 
-    # Subscribe to Breeze feeds.
-    newly_subscribed = []
+    # Take a feed reference per symbol; only 0→1 transitions hit Breeze.
     for symbol in stock_list:
         std = canonical_symbol(symbol)
         # get_breeze_symbol returns the correct Breeze code (e.g. "NIFTY 50", "MEDREM").
         # Do NOT call canonical_symbol on the result — it would turn "NIFTY 50" back to "NIFTY".
-        breeze_code = get_breeze_symbol(std)
-        if breeze_code in _subscribed_breeze_codes:
-            logger.info(f"Feed already active: {symbol} ({breeze_code}) — skipping")
-            continue
-        try:
-            client.subscribe_feeds(
-                exchange_code="NSE",
-                stock_code=breeze_code,
-                product_type="cash",
-                get_exchange_quotes=True,
-                get_market_depth=False
-            )
-            _subscribed_breeze_codes.add(breeze_code)
-            newly_subscribed.append((breeze_code, symbol))
-            logger.info(f"Subscribed to feed: {symbol} → Breeze code '{breeze_code}'")
-        except Exception as e:
-            logger.error(f"Failed to subscribe to {symbol} ({breeze_code}): {e}")
-
-    # Emit an initial quote snapshot for every subscribed symbol via REST.
+        if _acquire_feed(client, sid, get_breeze_symbol(std), std) and depth:
+            _acquire_depth_feed(client, sid, get_breeze_symbol(std), std)
+
+    # The SID may have disconnected while we were subscribing; handle_disconnect has
+    # already run, so release what was acquired after it.
+    if not socketio.server.manager.is_connected(sid, '/'):
+        _unregister_sid(sid)
+        _release_sid_feeds(sid)
+        return
+    # Likewise for a watchlist_remove that raced the subscribes above.
+    held = _sid_symbols.get(sid, set())
+    removed = [symbol for symbol in stock_list if canonical_symbol(symbol) not in held]
+    if removed:
+        _release_sid_feeds(sid, [get_breeze_symbol(canonical_symbol(symbol)) for symbol in removed])
+        stock_list = [symbol for symbol in stock_list if canonical_symbol(symbol) in held]
+
+    # Emit an initial quote snapshot for every subscribed symbol.
     # Breeze WebSocket only pushes ticks on NEW trade activity — illiquid small-caps
     # can go minutes without a tick, leaving the UI stuck on "Awaiting...".
-    # Fetching the REST quote immediately after subscribing bootstraps the UI with
-    # the last traded price, change, and bid/ask even before any WebSocket tick arrives.
-    socketio.sleep(0.3)  # allow WebSocket subscribe ACKs to arrive before REST calls
+    # Symbols with a fresh entry in the latest-quote store (another client subscribed
+    # recently, or the feed is live) are served from memory; only the rest go to REST.
+    bootstrap_started = time.monotonic()
+    rest_needed = []
     for symbol in stock_list:
         std = canonical_symbol(symbol)
-        breeze_code = get_breeze_symbol(std)
-        try:
+        book = _fresh_depth(std) if depth else None
+        if book is not None:
+            socketio.emit('market_depth', {"symbol": std, "seq": book.seq, "snapshot": True,
+                                           "levels": book.snapshot()["depth"]}, to=sid, namespace='/')
+        cached = _fresh_quote(std)
+        if cached is not None:
+            _emit_initial_quote(sid, std, cached, protocol, batch)
+            _bootstrap_stats["quotes_from_store"] += 1
+        else:
+            rest_needed.append(symbol)
+    if rest_needed:
+        socketio.sleep(0.3)  # allow WebSocket subscribe ACKs to arrive before REST calls
+        pool = eventlet.GreenPool(SNAPSHOT_CONCURRENCY)
+        for symbol in rest_needed:
+            pool.spawn_n(_fetch_initial_quote, client, sid, symbol, protocol, batch)
+        pool.waitall()
+
+    elapsed = time.monotonic() - bootstrap_started
+    _bootstrap_latency.observe(elapsed)
+    logger.info(f"Watchlist bootstrap for {sid}: {len(stock_list)} symbols "
+                f"({len(stock_list) - len(rest_needed)} from store, {len(rest_needed)} via REST) in {elapsed:.2f}s")
+
+
+def _fetch_initial_quote(client, sid: str, symbol: str, protocol: str, batch: bool) -> None:
+    """GreenPool worker: fetch one REST quote in the snapshot Breeze lane and emit it immediately."""
+    std = canonical_symbol(symbol)
+    breeze_code = get_breeze_symbol(std)
+    try:
+        with _breeze_lane("snapshot"):
             res = client.get_quotes(
                 stock_code=breeze_code,
                 exchange_code="NSE",
                 product_type="cash"
             )
-            raw = normalize_breeze_response(res)
-            # get_quotes returns {"Success": [<single dict>]}.
-            # normalize_breeze_response unwraps to the list; take the first (only) element.
-            if isinstance(raw, list):
-                raw = raw[0] if raw else None
-            if raw and isinstance(raw, dict):
-                payload = normalize_tick_for_frontend(dict(raw), std)
-                socketio.emit('watchlist_update', payload, to=sid, namespace='/')
-                logger.info(f"Initial quote emitted: {symbol} ltp={payload.get('ltp')}")
-        except Exception as e:
-            logger.warning(f"Initial quote fetch failed for {symbol}: {e}")
-
-    # Keep background task alive while this SID is connected.
-    # Ticks arrive via _global_on_ticks — no polling needed.
-    while True:
-        try:
-            if not socketio.server.manager.is_connected(sid, '/'):
-                logger.info(f"Client {sid} disconnected — cleaning up feeds.")
-                break
-        except Exception:
-            break
-        socketio.sleep(5)
-
-    # SID disconnected: remove from registry (also done in handle_disconnect, but belt-and-suspenders).
-    _unregister_sid(sid)
+        raw = normalize_breeze_response(res)
+        # get_quotes returns {"Success": [<single dict>]}.
+        # normalize_breeze_response unwraps to the list; take the first (only) element.
+        if isinstance(raw, list):
+            raw = raw[0] if raw else None
+        if raw and isinstance(raw, dict):
+            payload = normalize_tick_for_frontend(dict(raw), std)
+            _store_quote(std, payload)
+            # The new SID gets this quote as its snapshot, never as a delta ahead of the snapshot.
+            _publish_delta(std, payload, skip_sid=sid)
+            _emit_initial_quote(sid, std, payload, protocol, batch)
+            _bootstrap_stats["quotes_from_rest"] += 1
+            logger.info(f"Initial quote emitted: {symbol} ltp={payload.get('ltp')}")
+    except Exception as e:
+        _bootstrap_stats["rest_failures"] += 1
+        logger.warning(f"Initial quote fetch failed for {symbol}: {e}")
 
-    # Unsubscribe feeds that now have no registered subscribers.
-    for breeze_code, symbol in newly_subscribed:
-        # Check if any other SID still needs this symbol.
-        std = canonical_symbol(symbol)
-        remaining = _tick_registry.get(std, set())
-        if not remaining:
-            try:
-                client.unsubscribe_feeds(
-                    exchange_code="NSE",
-                    stock_code=breeze_code,
-                    product_type="cash",
-                    get_exchange_quotes=True,
-                    get_market_depth=False
-                )
-                _subscribed_breeze_codes.discard(breeze_code)
-                logger.info(f"Unsubscribed feed (no more subscribers): {symbol} ({breeze_code})")
-            except Exception as e:
-                logger.error(f"Error unsubscribing {symbol}: {e}")
 
-    # Disconnect Breeze WebSocket only when there are no more active subscribers at all.
-    if not any(s for sids in _tick_registry.values() for s in sids):
-        try:
-            client.ws_disconnect()
-            logger.info("Breeze WebSocket disconnected — no more subscribers")
-        except Exception as e:
-            logger.error(f"Error disconnecting WebSocket: {e}")
+# Multi-worker mode: join the tick bus (and the feed-owner election) as soon as the worker loads.
+# The feed process sets both up itself in run_feed_process().
+_IS_FEED_PROCESS = __name__ == "__main__" and sys.argv[1:2] == ["feed"]
+if TICK_BUS_PATH and not _IS_FEED_PROCESS:
+    _tick_bus = _UnixTickBus(TICK_BUS_PATH, elect=not FEED_PROCESS)
+    _tick_bus.start()
+if QUOTE_BOARD_PATH and not _IS_FEED_PROCESS:
+    _quote_board = _QuoteBoard(QUOTE_BOARD_PATH)
 
 
 # ─────────────────────────────────────────────
 # STARTUP
 # ─────────────────────────────────────────────
-if __name__ == "__main__":
+if _IS_FEED_PROCESS:
+    run_feed_process()
+elif __name__ == "__main__":
     initialize_ai_clients()
     port = int(os.environ.get("PORT", 8082))
     socketio.run(app, host="0.0.0.0", port=port, debug=False)
\ No newline at end of file
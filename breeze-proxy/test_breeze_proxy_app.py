@@ -0,0 +1,134 @@
+"""
+In-process tests for breeze_proxy_app's tick pipeline (no Breeze, Supabase or Gemini access).
+Run from breeze-proxy/: python -m pytest -q test_breeze_proxy_app.py
+"""
+import eventlet
+eventlet.monkey_patch()   # as under the gunicorn eventlet worker
+
+import json
+
+import pytest
+
+import breeze_proxy_app as proxy
+
+
+class _FakeBreeze:
+    """BreezeConnect stand-in: REST quotes at a settable price, feed calls accepted."""
+    session_key = "test"
+
+    def __init__(self):
+        self.ltp = 100.0
+        self.historical = []   # rows returned by get_historical_data
+
+    def get_quotes(self, **kwargs):
+        return {"Success": [{"stock_code": kwargs["stock_code"], "ltp": self.ltp,
+                             "ltp_percent_change": 0.0, "close": 99.0}], "Status": 200}
+
+    def get_historical_data(self, **kwargs):
+        return {"Success": self.historical, "Status": 200, "Error": None}
+
+    def subscribe_feeds(self, **kwargs):
+        return {"Status": 200}
+
+    def unsubscribe_feeds(self, **kwargs):
+        return {"Status": 200}
+
+
+@pytest.fixture
+def breeze(monkeypatch):
+    client = _FakeBreeze()
+    monkeypatch.setattr(proxy, "breeze_client", client)
+    monkeypatch.setattr(proxy, "ensure_breeze_session", lambda: (client, None, None))
+    monkeypatch.setattr(proxy, "get_breeze_symbol", lambda symbol: symbol)
+    monkeypatch.setattr(proxy, "_ensure_breeze_ws", lambda client: None)
+    return client
+
+
+def _dispatch(*ticks, settle=0.3):
+    """Feed raw Breeze ticks to the running dispatcher in one burst and wait past the conflation window."""
+    proxy._start_tick_dispatcher()
+    for tick in ticks:
+        proxy._global_on_ticks(dict(tick))
+    eventlet.sleep(settle)
+
+
+def test_minute_bar_includes_ticks_conflated_away():
+    dropped = proxy._tick_stream_stats["ticks_dropped"]
+    _dispatch({"stock_code": "MBARTEST", "last": 101.0, "ttq": 1000},
+              {"stock_code": "MBARTEST", "last": 110.0, "ttq": 1100},
+              {"stock_code": "MBARTEST", "last": 120.0, "ttq": 1200},
+              {"stock_code": "MBARTEST", "last": 102.0, "ttq": 1300})
+    assert proxy._tick_stream_stats["ticks_dropped"] - dropped == 3   # one conflation window
+
+    bars = proxy._minute_bars["MBARTEST"].ordered()   # two bars if the burst straddled a minute
+    assert bars["open"][0] == 101.0
+    assert bars["high"].max() == 120.0
+    assert bars["low"].min() == 101.0
+    assert bars["close"][-1] == 102.0
+    assert bars["volume"].sum() == 300.0
+
+
+def test_batch_delta_sid_gets_deltas_from_another_sids_bootstrap(breeze):
+    proxy._start_tick_dispatcher()
+    batched = proxy.socketio.test_client(proxy.app)
+    batched.emit("subscribe_to_watchlist", {"stocks": ["BDELTATEST"], "protocol": "delta", "batch": True})
+    eventlet.sleep(0.3)
+    _dispatch({"stock_code": "BDELTATEST", "last": 101.0})
+    proxy._latest_quotes.pop("BDELTATEST")   # stale store: the next subscriber bootstraps over REST
+    breeze.ltp = 105.0
+    other = proxy.socketio.test_client(proxy.app)
+    other.emit("subscribe_to_watchlist", {"stocks": ["BDELTATEST"]})
+    eventlet.sleep(0.3)
+    _dispatch({"stock_code": "BDELTATEST", "last": 106.0})
+
+    received = batched.get_received()
+    snapshot = next(m["args"][0] for m in received if m["name"] == "watchlist_snapshot")
+    deltas = [d for m in received if m["name"] == "watchlist_delta_batch" for d in m["args"][0]]
+    assert [d["seq"] for d in deltas] == [snapshot["seq"] + 1, snapshot["seq"] + 2, snapshot["seq"] + 3]
+    assert [d["changes"]["ltp"] for d in deltas] == [101.0, 105.0, 106.0]
+    batched.disconnect()
+    other.disconnect()
+
+
+def test_cached_historical_row_without_volume_is_valid_json(breeze, monkeypatch, tmp_path):
+    monkeypatch.setattr(proxy, "HISTORICAL_CACHE_DIR", str(tmp_path))
+    breeze.historical = [{"datetime": "2026-01-05 00:00:00", "open": "10", "high": "12", "low": "9", "close": "11"}]
+    response = proxy.app.test_client().post("/api/breeze/historical", json={
+        "stock_code": "NOVOLTEST", "from_date": "2026-01-05", "to_date": "2026-01-05", "interval": "1day"})
+
+    def reject(constant):
+        raise ValueError(f"{constant} is not valid JSON")
+
+    rows = json.loads(response.get_data(as_text=True), parse_constant=reject)["Success"]
+    assert response.headers["X-Historical-Source"] == "breeze"
+    assert rows[0]["close"] == 11.0
+    assert rows[0]["volume"] is None
+
+
+def test_alert_fires_on_crossing_reversed_within_conflation_window():
+    client = proxy.socketio.test_client(proxy.app)
+    ack = client.emit("alert_add", {"symbol": "ALERTTEST", "kind": "above", "threshold": 105}, callback=True)
+    assert "id" in ack
+    _dispatch({"stock_code": "ALERTTEST", "last": 101.0},
+              {"stock_code": "ALERTTEST", "last": 110.0},
+              {"stock_code": "ALERTTEST", "last": 102.0})
+
+    alerts = [m["args"][0] for m in client.get_received() if m["name"] == "price_alert"]
+    assert [(a["kind"], a["ltp"]) for a in alerts] == [("above", 110.0)]
+    client.disconnect()
+
+
+def test_depth_book_clears_levels_missing_from_update():
+    def levels(count, price):
+        return [{f"BestBuyRate-{n}": price - n, f"BestBuyQty-{n}": 10 * n, f"BuyNoOfOrders-{n}": n,
+                 f"BestSellRate-{n}": price + n, f"BestSellQty-{n}": 20 * n, f"SellNoOfOrders-{n}": n}
+                for n in range(1, count + 1)]
+
+    book = proxy._DepthBook()
+    assert book.apply(levels(5, 100.0)) == [1, 2, 3, 4, 5]
+    assert book.apply(levels(3, 100.0)) == [4, 5]
+
+    snapshot = book.snapshot()
+    assert snapshot["depth"][2]["bid_price"] == 97.0
+    for level in snapshot["depth"][3:]:
+        assert all(level[field] == 0.0 for field in proxy._DepthBook.FIELDS)
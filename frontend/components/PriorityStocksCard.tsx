@@ -108,7 +108,9 @@ export const PriorityStocksCard: React.FC<PriorityStocksCardProps> = ({ onNiftyT
     const symbolsToSubscribe = ['NIFTY', ...priorityStocks.map(s => s.symbol)];
     const connect = () => {
       const socket = io(getProxyBaseUrl(), {
-        transports: ['polling', 'websocket'],
+        // Polling first (see the proxy's Cloud Run notes); a proxy running WEB_WORKERS > 1 cannot keep a
+        // polling session on one worker, so such deployments build with VITE_PROXY_WEBSOCKET_ONLY=true.
+        transports: import.meta.env.VITE_PROXY_WEBSOCKET_ONLY === 'true' ? ['websocket'] : ['polling', 'websocket'],
         reconnection: true,
         reconnectionAttempts: Infinity,
         reconnectionDelay: 2000,
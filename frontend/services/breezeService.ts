@@ -166,6 +166,35 @@ export const fetchBreezeQuote = async (stockCode: string): Promise<BreezeQuote>
   return normalizeBreezeQuoteFromRow(row, stockCode);
 };
 
+/**
+ * Quotes for many NSE symbols in one proxy round trip (/api/breeze/quotes/batch).
+ * The proxy maps symbols to Breeze codes itself; results are keyed by the (upper-cased) symbol,
+ * and symbols it could not quote are returned in `errors` instead of failing the batch.
+ */
+export const fetchBreezeQuotesBatch = async (
+  symbols: string[]
+): Promise<{ quotes: Record<string, BreezeQuote>; errors: Record<string, string> }> => {
+  if (symbols.length === 0) return { quotes: {}, errors: {} };
+  const response = await fetch(resolveApiUrl(`/api/breeze/quotes/batch`), {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'X-Proxy-Key': localStorage.getItem('breeze_proxy_key') || "",
+      'Accept': 'application/json'
+    },
+    body: JSON.stringify({ symbols, exchange_code: 'NSE' })
+  });
+
+  const json = await response.json();
+  if (!response.ok) throw new Error(json.error || `Batch quote fetch failed`);
+
+  const quotes: Record<string, BreezeQuote> = {};
+  Object.entries(json.Success || {}).forEach(([code, row]) => {
+    quotes[code] = normalizeBreezeQuoteFromRow(row as Record<string, unknown>, code);
+  });
+  return { quotes, errors: json.errors || {} };
+};
+
 /**
  * Normalize raw Breeze API quote row (e.g. from REST or Socket.IO watchlist_update) to BreezeQuote.
  * Use this for socket payloads so the Nifty card always gets consistent field names.
@@ -268,4 +297,29 @@ export const fetchBreezeHistorical = async (stockCode: string, fromDate: string,
   }));
 };
 
+/**
+ * Today's 1-minute bars aggregated by the proxy from the live tick stream (no Breeze REST call).
+ * `from` / `to` are optional "HH:MM" IST bounds.
+ */
+export const fetchBreezeIntraday = async (symbol: string, from?: string, to?: string): Promise<HistoricalBar[]> => {
+  const params = new URLSearchParams({ symbol });
+  if (from) params.set('from', from);
+  if (to) params.set('to', to);
+  const response = await fetch(resolveApiUrl(`/api/breeze/intraday?${params.toString()}`), {
+    headers: { 'X-Proxy-Key': localStorage.getItem('breeze_proxy_key') || "" }
+  });
+
+  const json = await response.json();
+  if (!response.ok) throw new Error(json.error || `Intraday fetch failed`);
+
+  return (json.Success || []).map((bar: any) => ({
+    datetime: bar.datetime,
+    open: bar.open,
+    high: bar.high,
+    low: bar.low,
+    close: bar.close,
+    volume: bar.volume
+  }));
+};
+
 export const fetchBreezeNiftyQuote = () => fetchBreezeQuote('NIFTY');
\ No newline at end of file
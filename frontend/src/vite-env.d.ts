@@ -2,6 +2,7 @@
 
 interface ImportMetaEnv {
   readonly VITE_PROXY_URL?: string;
+  readonly VITE_PROXY_WEBSOCKET_ONLY?: string;
 }
 
 interface ImportMeta {